@@ -0,0 +1,76 @@
+# Throughput of MATCH_EVENTS-style delivery, run headlessly:
+#
+#     python benchmarks/bench_events.py [events]
+#
+# Publishes events in bursts of 10 from a producer thread to an async
+# iterator, a batched callback and a socket client at once, then checks that
+# a subscriber sleeping 1 s per event does not slow publishing down.
+import os
+import sys
+import time
+import socket
+import asyncio
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clicker_core import MatchEventBus, MatchEventServer
+
+def event():
+    return {"type": "match", "t": 0.0, "template": "a", "score": 0.9, "x": 1, "y": 2, "clicked": False}
+
+def main(n=100000):
+    bus = MatchEventBus()
+    got = [0]
+    bus.subscribe(lambda evs: got.__setitem__(0, got[0] + len(evs)), batch=True, max_pending=n)
+
+    path = os.path.join(tempfile.mkdtemp(), "events.sock")
+    server = MatchEventServer(bus, path=path, max_pending=n).start()
+    if server.path:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(server.path)
+    else:
+        client = socket.create_connection((server.host, server.port))
+    lines = [0]
+    def reader():
+        while True:
+            data = client.recv(1 << 16)
+            if not data: break
+            lines[0] += data.count(b"\n")
+    threading.Thread(target=reader, daemon=True).start()
+    time.sleep(0.1)
+
+    async def consume():
+        async with bus.events(max_pending=n) as events:
+            def produce():
+                for _ in range(n // 10):
+                    bus.publish_many([event() for _ in range(10)])
+            t0 = time.perf_counter()
+            producer = threading.Thread(target=produce)
+            producer.start()
+            received = 0
+            while received < n:
+                received += len(await events.next_batch())
+            producer.join()
+            dt = time.perf_counter() - t0
+            print(f"async iterator: {n} events in {dt:.2f} s ({n / dt:,.0f} events/s), {events.dropped} dropped")
+    asyncio.run(consume())
+
+    deadline = time.time() + 5
+    while (got[0] < n or lines[0] < n) and time.time() < deadline:
+        time.sleep(0.05)
+    print(f"callback received {got[0]}, socket client received {lines[0]}, published {bus.published}")
+
+    slow = bus.subscribe(lambda ev: time.sleep(1), max_pending=10)
+    t0 = time.perf_counter()
+    for _ in range(10000):
+        bus.publish(event())
+    print(f"publish with a stalled subscriber: {(time.perf_counter() - t0) * 1e6 / 10000:.1f} us/event, "
+          f"{slow.dropped} dropped by that subscriber")
+    slow.close()
+    server.stop()
+    client.close()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,68 @@
+# Profile switching with lazily decoded, shared templates, run headlessly:
+#
+#     python benchmarks/bench_profiles.py [profiles] [templates per profile] [pngs]
+#
+# Builds a temporary store of profiles whose templates are drawn from a
+# shared set of PNGs, then times ProfileStore load plus the LazyTemplate
+# list the main window builds on a switch, and the first access to every
+# template's pixels (what the first START of a profile pays).
+import os
+import sys
+import time
+import random
+import tempfile
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clicker_core
+from clicker_core import LazyTemplate, ProfileStore, TemplateCache
+
+def switch(store, name):
+    settings = store.load(name)
+    return [LazyTemplate(path=p, name=os.path.basename(p)) for p in settings.get("images", []) if os.path.exists(p)]
+
+def main(n_profiles=50, per_profile=20, n_pngs=40):
+    folder = tempfile.mkdtemp()
+    rng = np.random.default_rng(0)
+    pngs = []
+    for i in range(n_pngs):
+        path = os.path.join(folder, f"t{i}.png")
+        cv2.imwrite(path, rng.integers(0, 255, (64, 64, 3), dtype=np.uint8))
+        pngs.append(path)
+    pick = random.Random(0)
+    t0 = time.perf_counter()
+    store = ProfileStore(os.path.join(folder, "profiles"))
+    for i in range(n_profiles):
+        store.save(f"Profile {i}", {"confidence": 0.8, "images": pick.sample(pngs, per_profile)})
+    print(f"{n_profiles} profiles written in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    t0 = time.perf_counter()
+    store = ProfileStore(os.path.join(folder, "profiles"))
+    print(f"store opened in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    clicker_core.TEMPLATE_CACHE = cache = TemplateCache()
+    names = store.names()
+    first = []
+    for name in names:
+        t0 = time.perf_counter()
+        for templ in switch(store, name):
+            templ['data']
+        first.append(time.perf_counter() - t0)
+    switches = []
+    for _ in range(5):
+        for name in names:
+            t0 = time.perf_counter()
+            templates = switch(store, name)
+            switches.append(time.perf_counter() - t0)
+            for templ in templates:
+                templ['data']
+    switches.sort()
+    print(f"first use of each profile: {sum(first) * 1000 / len(first):.2f} ms mean, {cache.decodes} PNGs decoded for {n_pngs} files")
+    print(f"profile switch: {switches[len(switches) // 2] * 1000:.3f} ms median, {switches[-1] * 1000:.3f} ms max "
+          f"over {len(switches)} switches")
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:4]))
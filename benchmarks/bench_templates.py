@@ -0,0 +1,99 @@
+# matchTemplate calls per frame with template grouping off, with exact
+# duplicates shared (the default) and with dedupe_regions, for a real
+# profile or a synthetic bank:
+#
+#     python benchmarks/bench_templates.py [--profiles DIR] [--profile NAME] [FRAMES...]
+#
+# FRAMES are screenshots or session recordings (.acsrec). Without a profile
+# the script builds a 10-template bank with 2 exact duplicates, 1
+# near-duplicate, 2 crops and 3 unrelated templates.
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clicker_core import PROFILES_DIR, LazyTemplate, MatchEngine, ProfileStore, SessionReader
+
+MODES = (("grouping off", {"dedupe": False}),
+         ("exact duplicates", {}),
+         ("dedupe_regions", {"dedupe_regions": True}))
+
+def profile_templates(folder, name):
+    store = ProfileStore(folder)
+    settings = store.load(name or store.active)
+    disabled = set(settings.get("disabled", []))
+    templates = [LazyTemplate(path=p, name=os.path.basename(p), enabled=p not in disabled)
+                 for p in settings.get("images", []) if os.path.exists(p)]
+    return settings, templates
+
+def load_frames(paths):
+    frames = []
+    for path in paths:
+        if path.endswith(".acsrec"):
+            frames.extend(img for meta, img in SessionReader(path).frames() if img is not None)
+        else:
+            img = cv2.imread(path, cv2.IMREAD_COLOR)
+            if img is not None: frames.append(img)
+    return frames
+
+def synthetic():
+    rng = np.random.default_rng(0)
+    frame = cv2.GaussianBlur(rng.integers(0, 255, (600, 800, 3), dtype=np.uint8), (5, 5), 0)
+    def templ(name, img):
+        return {"name": name, "path": name + ".png", "data": np.ascontiguousarray(img)}
+    a = frame[100:160, 100:180]
+    near = a.copy()
+    near[29:31, 39:41] = 0
+    templates = [templ("a", a), templ("a_copy", a.copy()), templ("a_copy2", a.copy()), templ("a_near", near),
+                 templ("b", frame[300:380, 400:500]), templ("b_crop1", frame[310:350, 410:460]),
+                 templ("b_crop2", frame[330:370, 440:490])]
+    for i in range(3):
+        other = cv2.GaussianBlur(rng.integers(0, 255, (60, 60, 3), dtype=np.uint8), (5, 5), 0)
+        templates.append(templ(f"other{i}", other))
+    return {"confidence": 0.8}, templates, [frame] * 10
+
+def run(settings, templates, frames, extra):
+    cfg = {"confidence": settings.get("confidence", 0.8), "interval": 0.0, "multi_click": True}
+    cfg.update(extra)
+    engine = MatchEngine(cfg, templates)
+    clicks = []
+    t0 = time.perf_counter()
+    for i, frame in enumerate(frames):
+        clicks.append(engine.process(frame, float(i))["clicks"])
+    return engine, clicks, time.perf_counter() - t0
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--profiles", default=PROFILES_DIR)
+    ap.add_argument("--profile")
+    ap.add_argument("frames", nargs="*")
+    args = ap.parse_args(argv)
+    if args.frames:
+        settings, templates = profile_templates(args.profiles, args.profile)
+        frames = load_frames(args.frames)
+        if not templates or not frames:
+            print("No templates or frames to measure.")
+            return 1
+    else:
+        settings, templates, frames = synthetic()
+    print(f"{len(templates)} templates, {len(frames)} frames")
+    baseline = None
+    for label, extra in MODES:
+        engine, clicks, dt = run(settings, templates, frames, extra)
+        st = engine.stats
+        n = st["frames"] or 1
+        if engine.bank is not None:
+            print("  " + engine.bank.describe())
+        same = "" if baseline is None else (", same clicks" if clicks == baseline else ", DIFFERENT clicks")
+        print(f"{label}: {st['full'] / n:.2f} full-frame and {st['roi'] / n:.2f} region matchTemplate calls "
+              f"per frame, {st['shared'] / n:.2f} shared, {dt:.2f} s{same}")
+        if baseline is None: baseline = clicks
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,22 @@
 import sys
 import os
 import time
-import json
-import numpy as np
+import asyncio
+import ctypes
+import ctypes.wintypes
+
+if __name__ == "__main__" and sys.argv[1:2] == ["--replay"]:
+    # Headless replay must not pull in Qt or pyautogui.
+    from clicker_core import replay_main
+    sys.exit(replay_main(sys.argv[2:]))
+
 import cv2
-import pyautogui
-import mss
-import traceback
 from PyQt6 import QtWidgets, QtCore, QtGui
 
-try:
-    import win32gui
-    import win32con
-    import win32api
-except ImportError as e:
-    sys.exit(1)
-
-pyautogui.FAILSAFE = True
+import clicker_core
+from clicker_core import (GEOMETRY_CACHE, TEMPLATE_CACHE, MATCH_EVENTS, MATCH_CACHE_FILE, SESSIONS_DIR,
+                          WM_DISPLAYCHANGE, WindowUtils, LazyTemplate, ProfileStore, MatchCache,
+                          SessionRecorder, MatchEventServer, AsyncClickerEngine, engine_config)
 
 SETTINGS_FILE = "clicker_settings.json"
 
@@ -44,7 +44,10 @@ TRANSLATIONS = {
         "stopped": "Stopped",
         "running": "Running...",
         "about": "About Author",
-        "lang": "Language:"
+        "lang": "Language:",
+        "profile": "Profile:",
+        "new_profile": "New Profile",
+        "delete_profile": "Delete profile"
     },
     "RU": {
         "title": "Auto Click Simple 29.1.fix",
@@ -69,7 +72,10 @@ TRANSLATIONS = {
         "stopped": "Остановлен",
         "running": "Работает...",
         "about": "Об авторе",
-        "lang": "Язык:"
+        "lang": "Язык:",
+        "profile": "Профиль:",
+        "new_profile": "Новый профиль",
+        "delete_profile": "Удалить профиль"
     }
 }
 
@@ -80,200 +86,48 @@ class Signals(QtCore.QObject):
     match_found = QtCore.pyqtSignal(str, int, int)
     debug_frame = QtCore.pyqtSignal(object)
 
-class WindowUtils:
-    @staticmethod
-    def get_window_list():
-        wins = []
-        try:
-            def enum_cb(hwnd, _):
-                if win32gui.IsWindowVisible(hwnd) and win32gui.GetWindowText(hwnd):
-                    try:
-                        rect = win32gui.GetWindowRect(hwnd)
-                        w = rect[2] - rect[0]
-                        h = rect[3] - rect[1]
-                        if w > 0 and h > 0:
-                            wins.append((hwnd, win32gui.GetWindowText(hwnd)))
-                    except: pass
-            win32gui.EnumWindows(enum_cb, None)
-        except Exception as e:
-            pass
-        return sorted(wins, key=lambda x: x[1])
-
-    @staticmethod
-    def get_window_rect(hwnd):
-        try:
-            rect = win32gui.GetWindowRect(hwnd)
-            return rect
-        except:
-            return None
-
-    @staticmethod
-    def background_click(hwnd, x_screen, y_screen):
-        try:
-            point = win32gui.ScreenToClient(hwnd, (x_screen, y_screen))
-            lparam = win32api.MAKELONG(point[0], point[1])
-            win32gui.PostMessage(hwnd, win32con.WM_LBUTTONDOWN, win32con.MK_LBUTTON, lparam)
-            win32gui.PostMessage(hwnd, win32con.WM_LBUTTONUP, 0, lparam)
-        except Exception:
-            pass
-
 class ClickerWorker(QtCore.QThread):
-    def __init__(self, config, templates, signals):
+    # Qt adapter over AsyncClickerEngine: runs it on a private event loop in
+    # this thread and forwards its callbacks to Signals.
+    def __init__(self, config, templates, signals, geometry=None, match_cache=None, recorder=None):
         super().__init__()
         self.config = config
         self.templates = templates
         self.signals = signals
-        self._is_running = True
-        self.last_click_time = 0
+        self.core = AsyncClickerEngine(config, templates, geometry=geometry, match_cache=match_cache,
+                                       recorder=recorder, on_log=signals.log.emit,
+                                       on_click=signals.match_found.emit, on_frame=self._emit_frame)
+        self._loop = None
+        self._stop_requested = False
 
     def update_config(self, key, value):
         self.config[key] = value
 
+    def _emit_frame(self, canvas):
+        img_rgb = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB)
+        ih, iw, ch = img_rgb.shape
+        qimg = QtGui.QImage(img_rgb.data, iw, ih, ch * iw, QtGui.QImage.Format.Format_RGB888)
+        self.signals.debug_frame.emit(qimg.copy())
+
     def run(self):
-        self.signals.log.emit(f"Worker started. Mode: {self.config.get('mode')}")
         self.signals.started.emit()
-        
-        target_hwnd = self.config.get('target_hwnd', 0)
-        use_window = self.config.get('use_window', False) and target_hwnd != 0
-
-        with mss.mss() as sct:
-            while self._is_running:
-                loop_start = time.time()
-                try:
-                    monitor = {}
-                    current_rect = None
-                    monitor_offset = (0, 0)
-                    
-                    if use_window:
-                        if win32gui.IsIconic(target_hwnd):
-                             time.sleep(1)
-                             continue
-
-                        rect = WindowUtils.get_window_rect(target_hwnd)
-                        if not rect:
-                            self.signals.log.emit("Target window lost or closed.")
-                            break
-                        
-                        rel_Region = self.config.get("relative_region")
-                        if rel_Region:
-                             abs_x = rect[0] + rel_Region[0]
-                             abs_y = rect[1] + rel_Region[1]
-                             w = rel_Region[2]
-                             h = rel_Region[3]
-                             current_rect = (abs_x, abs_y, w, h)
-                        else:
-                             current_rect = (rect[0], rect[1], rect[2]-rect[0], rect[3]-rect[1])
-                    else:
-                        current_rect = self.config.get('region')
-
-                    if current_rect:
-                        vx = win32api.GetSystemMetrics(76)
-                        vy = win32api.GetSystemMetrics(77)
-                        vw = win32api.GetSystemMetrics(78)
-                        vh = win32api.GetSystemMetrics(79)
-                        
-                        rx, ry, rw, rh = current_rect
-                        
-                        x1 = max(vx, rx)
-                        y1 = max(vy, ry)
-                        x2 = min(vx + vw, rx + rw)
-                        y2 = min(vy + vh, ry + rh)
-                        
-                        w_new = int(x2 - x1)
-                        h_new = int(y2 - y1)
-                        
-                        if w_new <= 0 or h_new <= 0:
-                            time.sleep(0.1)
-                            continue
-                            
-                        monitor = {
-                            "left": int(x1),
-                            "top": int(y1),
-                            "width": w_new,
-                            "height": h_new
-                        }
-                        monitor_offset = (int(x1), int(y1))
-
-                    if not monitor:
-                        time.sleep(0.1)
-                        continue
-
-                    sct_img = sct.grab(monitor)
-                    img_np = np.array(sct_img)
-                    img_bgr = cv2.cvtColor(img_np, cv2.COLOR_BGRA2BGR)
-                    
-                    found_click_this_frame = False
-
-                    for templ in self.templates:
-                        if not self._is_running: break
-                        if not self.config.get('multi_click') and found_click_this_frame: break
-
-                        if not templ.get('enabled', True):
-                            continue
-
-                        template_img = templ['data']
-                        h, w = template_img.shape[:2]
-
-                        res = cv2.matchTemplate(img_bgr, template_img, cv2.TM_CCOEFF_NORMED)
-                        threshold = self.config.get('confidence', 0.8)
-                        
-                        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
-                        
-                        if self.config.get('debug', False) and templ.get('enabled', True):
-                            top_left = max_loc
-                            bottom_right = (top_left[0] + w, top_left[1] + h)
-                            color = (0, 0, 255) 
-                            if max_val >= threshold:
-                                color = (0, 255, 0)
-                            
-                            cv2.rectangle(img_bgr, top_left, bottom_right, color, 2)
-                            cv2.putText(img_bgr, f"{max_val:.2f}", (top_left[0], top_left[1]-5), 
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
-
-                        if max_val >= threshold:
-                            can_click = True
-                            if not self.config.get('multi_click') and found_click_this_frame:
-                                can_click = False
-                            
-                            if can_click:
-                                now = time.time()
-                                if now - self.last_click_time >= self.config.get('interval', 1.0):
-                                    match_cx = max_loc[0] + w // 2
-                                    match_cy = max_loc[1] + h // 2
-                                    
-                                    final_x = monitor_offset[0] + match_cx
-                                    final_y = monitor_offset[1] + match_cy
-                                    
-                                    self.signals.match_found.emit(templ['name'], final_x, final_y)
-                                    self.signals.log.emit(f"Click: {templ['name']} ({max_val:.2f})")
-
-                                    mode = self.config.get('click_mode', 'Mouse')
-                                    if mode == 'Background' and use_window and target_hwnd:
-                                        WindowUtils.background_click(target_hwnd, final_x, final_y)
-                                    else:
-                                        pyautogui.click(x=final_x, y=final_y)
-                                    
-                                    self.last_click_time = now
-                                    found_click_this_frame = True
-
-                    if self.config.get('debug', False):
-                        img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-                        ih, iw, ch = img_rgb.shape
-                        qimg = QtGui.QImage(img_rgb.data, iw, ih, ch * iw, QtGui.QImage.Format.Format_RGB888)
-                        self.signals.debug_frame.emit(qimg.copy())
-
-                except Exception as e:
-                    self.signals.log.emit(f"Error: {e}")
-                    time.sleep(1)
-                
-                elapsed = time.time() - loop_start
-                if elapsed < 0.033:
-                    time.sleep(0.033 - elapsed)
-
+        asyncio.run(self._main())
         self.signals.stopped.emit()
 
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        if self._stop_requested:
+            return
+        await self.core.start()
+        await self.core.wait()
+
     def stop(self):
-        self._is_running = False
+        # Non-blocking; the thread emits finished once cleanup is done.
+        self._stop_requested = True
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            try: loop.call_soon_threadsafe(self.core.request_stop)
+            except RuntimeError: pass
 
 class RegionSelector(QtWidgets.QWidget):
     def __init__(self, callback):
@@ -347,10 +201,18 @@ class AutoClickerApp(QtWidgets.QMainWindow):
         self.settings = {}
         self.templates = []
         self.worker = None
+        self._retired = set()
         self.debug_win = None
+        self.match_cache = None
+        self.store = None
+        self.profile = "Default"
+        self._icons = {}
+        self._applying = False
+        self.event_server = None
         self.lang = "EN"
         self.load_settings()
         self._init_ui()
+        self._start_event_server()
 
     def _init_ui(self):
         self._set_theme()
@@ -451,6 +313,23 @@ class AutoClickerApp(QtWidgets.QMainWindow):
         
         self.chk_multi = QtWidgets.QCheckBox()
         self.chk_debug = QtWidgets.QCheckBox()
+
+        h_profile = QtWidgets.QHBoxLayout()
+        self.lbl_profile = QtWidgets.QLabel()
+        self.cbo_profile = QtWidgets.QComboBox()
+        self.cbo_profile.addItems(self.store.names())
+        self.cbo_profile.setCurrentText(self.profile)
+        self.cbo_profile.currentTextChanged.connect(self._switch_profile)
+        self.btn_new_profile = QtWidgets.QPushButton("+")
+        self.btn_new_profile.setFixedWidth(28)
+        self.btn_new_profile.clicked.connect(self._new_profile)
+        self.btn_del_profile = QtWidgets.QPushButton("-")
+        self.btn_del_profile.setFixedWidth(28)
+        self.btn_del_profile.clicked.connect(self._delete_profile)
+        h_profile.addWidget(self.lbl_profile)
+        h_profile.addWidget(self.cbo_profile, 1)
+        h_profile.addWidget(self.btn_new_profile)
+        h_profile.addWidget(self.btn_del_profile)
         
         h_lang = QtWidgets.QHBoxLayout()
         self.lbl_lang = QtWidgets.QLabel()
@@ -460,6 +339,7 @@ class AutoClickerApp(QtWidgets.QMainWindow):
         h_lang.addWidget(self.lbl_lang)
         h_lang.addWidget(self.cbo_lang)
 
+        v_sett.addLayout(h_profile)
         v_sett.addWidget(self.spin_conf)
         v_sett.addWidget(self.spin_interval)
         v_sett.addWidget(self.lbl_mode)
@@ -501,6 +381,14 @@ class AutoClickerApp(QtWidgets.QMainWindow):
 
         self.chk_multi.toggled.connect(self._update_worker_multi)
 
+        self.save_timer = QtCore.QTimer(self)
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(500)
+        self.save_timer.timeout.connect(self.save_settings)
+        for sig in (self.spin_conf.valueChanged, self.spin_interval.valueChanged, self.chk_multi.toggled,
+                    self.chk_debug.toggled, self.rdo_window.toggled, self.list_imgs.itemChanged):
+            sig.connect(self._mark_dirty)
+
     def _set_theme(self):
         bg_style = ""
         if os.path.exists("bg.png"):
@@ -568,6 +456,8 @@ class AutoClickerApp(QtWidgets.QMainWindow):
 
     def _change_lang(self, text):
         self.lang = text
+        if self.store and self.store.app_setting("lang") != text:
+            self.store.set_app_setting("lang", text)
         self._update_ui_text()
 
     def _update_ui_text(self):
@@ -594,6 +484,9 @@ class AutoClickerApp(QtWidgets.QMainWindow):
         self.chk_multi.setText(t["multi_click"])
         self.chk_debug.setText(t["show_vision"])
         self.lbl_lang.setText(t["lang"])
+        self.lbl_profile.setText(t["profile"])
+        self.btn_new_profile.setToolTip(t["new_profile"])
+        self.btn_del_profile.setToolTip(t["delete_profile"])
         
         if self.worker:
             self.btn_start.setText(t["stop"])
@@ -638,7 +531,7 @@ class AutoClickerApp(QtWidgets.QMainWindow):
     def _refresh_windows(self):
         cur_text = self.cbo_windows.currentText()
         self.cbo_windows.clear()
-        self.win_list = WindowUtils.get_window_list()
+        self.win_list = WindowUtils.get_window_list(refresh=True)
         for h, title in self.win_list:
             self.cbo_windows.addItem(title, h)
         idx = self.cbo_windows.findText(cur_text)
@@ -672,37 +565,40 @@ class AutoClickerApp(QtWidgets.QMainWindow):
                 self.settings["region"] = [x,y,w,h]
                 self.settings["relative_region"] = None
                 self.lbl_region_info.setText(f"Rect: {x},{y} {w}x{h}")
+            self._mark_dirty()
 
     def _add_image(self):
         paths, _ = QtWidgets.QFileDialog.getOpenFileNames(self, "Select Images", "", "Images (*.png *.jpg *.jpeg *.bmp)")
         for path in paths:
             if path not in [t['path'] for t in self.templates]:
+                if TEMPLATE_CACHE.get(path) is None:
+                    self._log(f"Error loading {path}: not a readable image")
+                    continue
                 self._load_template(path)
+        self._mark_dirty()
 
-    def _load_template(self, path):
+    def _load_template(self, path, enabled=True):
+        # Only registers the template; pixels are decoded on first use through
+        # TEMPLATE_CACHE and Qt loads the file-backed icon when it is painted.
         try:
-            stream = open(path, "rb")
-            bytes = bytearray(stream.read())
-            arr = np.asarray(bytes, dtype=np.uint8)
-            img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-            if img is not None:
-                name = os.path.basename(path)
-                self.templates.append({"path": path, "name": name, "data": img, "enabled": True})
-                
-                if img.size > 0:
-                   icon_img = cv2.resize(img, (48, 48), interpolation=cv2.INTER_AREA)
-                   icon = QtGui.QIcon(QtGui.QPixmap.fromImage(QtGui.QImage(icon_img.data, icon_img.shape[1], icon_img.shape[0], icon_img.strides[0], QtGui.QImage.Format.Format_BGR888)))
-                   item = QtWidgets.QListWidgetItem(icon, name)
-                   item.setFlags(item.flags() | QtCore.Qt.ItemFlag.ItemIsUserCheckable)
-                   item.setCheckState(QtCore.Qt.CheckState.Checked)
-                   
-                   self.list_imgs.addItem(item)
+            name = os.path.basename(path)
+            self.templates.append(LazyTemplate(path=path, name=name, enabled=enabled))
+
+            icon = self._icons.get(path)
+            if icon is None:
+                icon = self._icons[path] = QtGui.QIcon(path)
+            item = QtWidgets.QListWidgetItem(icon, name)
+            item.setFlags(item.flags() | QtCore.Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(QtCore.Qt.CheckState.Checked if enabled else QtCore.Qt.CheckState.Unchecked)
+            
+            self.list_imgs.addItem(item)
         except Exception as e:
             self._log(f"Error loading {path}: {e}")
 
     def _clear_images(self):
          self.templates.clear()
          self.list_imgs.clear()
+         self._mark_dirty()
 
     def _img_context_menu(self, pos):
         item = self.list_imgs.itemAt(pos)
@@ -714,6 +610,7 @@ class AutoClickerApp(QtWidgets.QMainWindow):
                 row = self.list_imgs.row(item)
                 self.list_imgs.takeItem(row)
                 self.templates.pop(row)
+                self._mark_dirty()
 
     def _log(self, msg):
         self.txt_log.appendPlainText(time.strftime("[%H_%M_%S] ") + msg)
@@ -736,11 +633,17 @@ class AutoClickerApp(QtWidgets.QMainWindow):
     def _toggle_start(self):
         t = TRANSLATIONS.get(self.lang, TRANSLATIONS["EN"])
         if self.worker:
-            self.worker.stop()
-            self.worker.wait()
+            worker = self.worker
+            worker.stop()
+            self._retired.add(worker)
+            worker.finished.connect(self._reap_workers)
             self.worker = None
             self.btn_start.setText(t["start"])
             self.btn_start.setStyleSheet("background-color: #1b5e20; color: white; font-size: 15px; font-weight: bold; border-radius: 6px;")
+            # The next run shares the match cache, so it can't start until
+            # the stopping worker has saved it.
+            self.btn_start.setEnabled(False)
+            self._reap_workers()
             self._enable_controls(True)
             self.lbl_status.setText(t["stopped"])
             self.lbl_status.setStyleSheet("color: #888;")
@@ -755,7 +658,7 @@ class AutoClickerApp(QtWidgets.QMainWindow):
             self.lbl_status.setText(t["running"])
             self.lbl_status.setStyleSheet("color: #4caf50;")
             
-            cfg = {
+            cfg = engine_config(self.settings, {
                 "use_window": self.rdo_window.isChecked(),
                 "target_hwnd": self.cbo_windows.currentData() if self.rdo_window.isChecked() else 0,
                 "region": self.settings.get("region"),
@@ -765,64 +668,173 @@ class AutoClickerApp(QtWidgets.QMainWindow):
                 "click_mode": "Background" if "Background" in self.cbo_mode.currentText() else "Mouse",
                 "multi_click": self.chk_multi.isChecked(),
                 "debug": self.chk_debug.isChecked()
-            }
+            })
             
             sig = Signals()
             sig.log.connect(self._log)
             sig.debug_frame.connect(lambda qimg: self.debug_win.update_frame(qimg) if self.debug_win and self.debug_win.isVisible() else None)
             
-            self.worker = ClickerWorker(cfg, self.templates, sig)
+            recorder = None
+            if self.settings.get("record_session", False):
+                name = time.strftime("session_%Y%m%d_%H%M%S.acsrec")
+                recorder = SessionRecorder(os.path.join(self.settings.get("sessions_dir", SESSIONS_DIR), name))
+
+            self.worker = ClickerWorker(cfg, self.templates, sig, match_cache=self._get_match_cache(), recorder=recorder)
             self.worker.start()
 
+    def _reap_workers(self):
+        self._retired = {w for w in self._retired if not w.isFinished()}
+        if not self._retired:
+            self.btn_start.setEnabled(True)
+
+    def _get_match_cache(self):
+        s = self.settings
+        if not s.get("match_cache", False):
+            return None
+        if self.match_cache is None:
+            self.match_cache = MatchCache(
+                max_entries=s.get("match_cache_size", 256),
+                max_mb=s.get("match_cache_mb", 4.0),
+                mode=s.get("match_cache_mode", "exact"),
+                verify_rate=s.get("match_cache_verify", 0.0),
+                path=MATCH_CACHE_FILE if s.get("match_cache_persist", False) else None)
+            self.match_cache.load()
+        return self.match_cache
+
+    def _start_event_server(self):
+        if not self.store.app_setting("event_server", False):
+            return
+        try:
+            self.event_server = MatchEventServer(MATCH_EVENTS, path=self.store.app_setting("event_socket"),
+                                                 port=self.store.app_setting("event_port", 0)).start()
+            self._log(f"Event server listening on {self.event_server.address}")
+        except Exception as e:
+            self.event_server = None
+            self._log(f"Event server error: {e}")
+
     def _enable_controls(self, enable):
         pass
 
     def load_settings(self):
-        try:
-            if os.path.exists(SETTINGS_FILE):
-                with open(SETTINGS_FILE, "r") as f: self.settings = json.load(f)
-        except: self.settings = {}
+        self.store = ProfileStore()
+        self.store.import_legacy(SETTINGS_FILE)
+        names = self.store.names()
+        self.profile = self.store.active if self.store.active in names else names[0]
+        self.settings = self.store.load(self.profile)
+        self.lang = self.store.app_setting("lang", "EN")
 
     def _apply_settings(self):
+        self._applying = True
         s = self.settings
         self.rdo_window.setChecked(s.get("use_window", False))
         self.rdo_region.setChecked(not s.get("use_window", False))
         r = s.get("region")
+        rel = s.get("relative_region")
         if r: self.lbl_region_info.setText(f"Rect: {r[0]},{r[1]} {r[2]}x{r[3]}")
+        elif rel: self.lbl_region_info.setText(f"Rel: {rel[0]},{rel[1]} {rel[2]}x{rel[3]}")
+        else: self.lbl_region_info.setText("")
         self.spin_conf.setValue(s.get("confidence", 0.8))
         self.spin_interval.setValue(s.get("interval", 1.0))
         self.chk_multi.setChecked(s.get("multi", False))
         self.chk_debug.setChecked(s.get("debug", False))
         
-        self.lang = s.get("lang", "EN")
         self.cbo_lang.setCurrentText(self.lang)
         
+        self.templates.clear()
+        self.list_imgs.clear()
+        disabled = set(s.get("disabled", []))
         for p in s.get("images", []):
-            if os.path.exists(p): self._load_template(p)
+            if os.path.exists(p): self._load_template(p, enabled=p not in disabled)
         self._refresh_windows()
+        self._applying = False
 
-    def closeEvent(self, event):
+    def _collect_settings(self):
         s = self.settings
         s["use_window"] = self.rdo_window.isChecked()
         s["confidence"] = self.spin_conf.value()
         s["interval"] = self.spin_interval.value()
         s["multi"] = self.chk_multi.isChecked()
         s["debug"] = self.chk_debug.isChecked()
-        s["lang"] = self.lang
         s["images"] = [t['path'] for t in self.templates]
+        s["disabled"] = [t['path'] for t in self.templates if not t.get('enabled', True)]
+        return s
+
+    def _mark_dirty(self, *args):
+        if not self._applying:
+            self.save_timer.start()
+
+    def save_settings(self):
+        self.save_timer.stop()
+        if self.profile is None:
+            return
+        try: self.store.save(self.profile, self._collect_settings())
+        except Exception as e: self._log(f"Error saving profile: {e}")
+
+    def _switch_profile(self, name):
+        if not name or name == self.profile:
+            return
+        if self.worker:
+            self.cbo_profile.blockSignals(True)
+            self.cbo_profile.setCurrentText(self.profile)
+            self.cbo_profile.blockSignals(False)
+            return
+        self.save_settings()
+        self.profile = name
+        self.store.set_active(name)
+        self.settings = self.store.load(name)
+        self._apply_settings()
+        self._update_ui_text()
+
+    def _new_profile(self):
+        t = TRANSLATIONS.get(self.lang, TRANSLATIONS["EN"])
+        name, ok = QtWidgets.QInputDialog.getText(self, t["new_profile"], t["profile"])
+        name = name.strip()
+        if not ok or not name or name in self.store.names():
+            return
+        self.save_settings()
+        self.store.save(name, self.settings)
+        self.cbo_profile.addItem(name)
+        self.cbo_profile.setCurrentText(name)
+
+    def _delete_profile(self):
+        t = TRANSLATIONS.get(self.lang, TRANSLATIONS["EN"])
+        if self.worker or len(self.store.names()) <= 1:
+            return
+        res = QtWidgets.QMessageBox.question(self, t["delete_profile"], f"{t['delete_profile']}: {self.profile}?")
+        if res != QtWidgets.QMessageBox.StandardButton.Yes:
+            return
+        name = self.profile
+        self.store.delete(name)
+        self.profile = None
+        self.cbo_profile.removeItem(self.cbo_profile.findText(name))
+        self._switch_profile(self.cbo_profile.currentText())
+
+    def nativeEvent(self, eventType, message):
         try:
-            with open(SETTINGS_FILE, "w") as f: json.dump(s, f, indent=2)
+            if eventType == b"windows_generic_MSG":
+                msg = ctypes.wintypes.MSG.from_address(int(message))
+                if msg.message == WM_DISPLAYCHANGE:
+                    GEOMETRY_CACHE.invalidate()
         except: pass
+        return super().nativeEvent(eventType, message)
+
+    def closeEvent(self, event):
+        self.save_settings()
         if self.worker:
             self.worker.stop()
-            self.worker.wait()
+            self._retired.add(self.worker)
+        for worker in list(self._retired):
+            worker.wait()
+        if self.event_server: self.event_server.stop()
         if self.debug_win: self.debug_win.close()
         super().closeEvent(event)
 
 def main():
+    if clicker_core.win32gui is None:
+        sys.exit(1)
+
     try:
         try:
-            import ctypes
             ctypes.windll.shcore.SetProcessDpiAwareness(2)
         except: 
             pass
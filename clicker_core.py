@@ -0,0 +1,1524 @@
+import os
+import copy
+import time
+import json
+import random
+import hashlib
+import queue
+import socket
+import struct
+import asyncio
+import concurrent.futures
+import itertools
+import threading
+import traceback
+import weakref
+from collections import OrderedDict, deque
+import numpy as np
+import cv2
+
+# Headless core of the clicker: everything that does not need Qt. pywin32,
+# mss and pyautogui are only touched by the classes that talk to the real
+# desktop, so the module imports (and its fakes run) on any platform.
+try:
+    import win32gui
+    import win32con
+    import win32api
+except ImportError:
+    win32gui = win32con = win32api = None
+
+MATCH_CACHE_FILE = "clicker_match_cache.json"
+SESSIONS_DIR = "sessions"
+PROFILES_DIR = "clicker_profiles"
+WM_DISPLAYCHANGE = 0x007E
+
+class GeometryProvider:
+    # Platform interface used by GeometryCache. Every call here is a real
+    # OS query, so the cache counts them to report what it saved.
+    def is_iconic(self, hwnd):
+        raise NotImplementedError
+
+    def get_window_rect(self, hwnd):
+        raise NotImplementedError
+
+    def get_virtual_screen(self):
+        raise NotImplementedError
+
+    def enum_windows(self):
+        raise NotImplementedError
+
+class Win32GeometryProvider(GeometryProvider):
+    def is_iconic(self, hwnd):
+        try:
+            return bool(win32gui.IsIconic(hwnd))
+        except:
+            return False
+
+    def get_window_rect(self, hwnd):
+        try:
+            return tuple(win32gui.GetWindowRect(hwnd))
+        except:
+            return None
+
+    def get_virtual_screen(self):
+        return (win32api.GetSystemMetrics(win32con.SM_XVIRTUALSCREEN),
+                win32api.GetSystemMetrics(win32con.SM_YVIRTUALSCREEN),
+                win32api.GetSystemMetrics(win32con.SM_CXVIRTUALSCREEN),
+                win32api.GetSystemMetrics(win32con.SM_CYVIRTUALSCREEN))
+
+    def enum_windows(self):
+        wins = []
+        try:
+            def enum_cb(hwnd, _):
+                if win32gui.IsWindowVisible(hwnd) and win32gui.GetWindowText(hwnd):
+                    try:
+                        rect = win32gui.GetWindowRect(hwnd)
+                        w = rect[2] - rect[0]
+                        h = rect[3] - rect[1]
+                        if w > 0 and h > 0:
+                            wins.append((hwnd, win32gui.GetWindowText(hwnd)))
+                    except: pass
+            win32gui.EnumWindows(enum_cb, None)
+        except Exception as e:
+            pass
+        return wins
+
+class FakeGeometryProvider(GeometryProvider):
+    # In-memory stand-in so the cache can be driven without Win32.
+    def __init__(self, screen=(0, 0, 1920, 1080)):
+        self.screen = tuple(screen)
+        self.windows = {}
+        self.calls = 0
+
+    def set_window(self, hwnd, title, rect, iconic=False):
+        self.windows[hwnd] = {"title": title, "rect": tuple(rect), "iconic": iconic}
+
+    def remove_window(self, hwnd):
+        self.windows.pop(hwnd, None)
+
+    def is_iconic(self, hwnd):
+        self.calls += 1
+        win = self.windows.get(hwnd)
+        return bool(win and win["iconic"])
+
+    def get_window_rect(self, hwnd):
+        self.calls += 1
+        win = self.windows.get(hwnd)
+        return win["rect"] if win else None
+
+    def get_virtual_screen(self):
+        self.calls += 4
+        return self.screen
+
+    def enum_windows(self):
+        self.calls += 1
+        return [(h, w["title"]) for h, w in self.windows.items() if w["title"]]
+
+class GeometryCache:
+    # Window rects, iconic state and virtual-screen metrics are re-queried at
+    # most once per TTL, or sooner after invalidate() (display change, window
+    # re-selection, pre-click check). Frames in between reuse cached values.
+    # view() returns a handle on the same entries with its own stats, so
+    # engines sharing GEOMETRY_CACHE each report only their own queries.
+    def __init__(self, provider, rect_ttl=0.2, screen_ttl=2.0, list_ttl=2.0, clock=time.monotonic):
+        self.provider = provider
+        self.rect_ttl = rect_ttl
+        self.screen_ttl = screen_ttl
+        self.list_ttl = list_ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._windows = {}
+        self._cached = {}
+        self._monitors = {}
+        self.queries = 0
+        self.requested = 0
+        self.query_time = 0.0
+
+    def _query(self, cost, func, *args):
+        t0 = time.perf_counter()
+        result = func(*args)
+        self.query_time += time.perf_counter() - t0
+        self.queries += cost
+        return result
+
+    def window_state(self, hwnd):
+        with self._lock:
+            self.requested += 2
+            now = self.clock()
+            entry = self._windows.get(hwnd)
+            if entry is None or now - entry[0] > self.rect_ttl:
+                iconic = self._query(1, self.provider.is_iconic, hwnd)
+                rect = self._query(1, self.provider.get_window_rect, hwnd)
+                entry = (now, rect, iconic)
+                self._windows[hwnd] = entry
+            return entry[1], entry[2]
+
+    def window_rect(self, hwnd):
+        return self.window_state(hwnd)[0]
+
+    def virtual_screen(self):
+        with self._lock:
+            self.requested += 4
+            now = self.clock()
+            screen = self._cached.get("screen")
+            if screen is None or now - screen[0] > self.screen_ttl:
+                screen = self._cached["screen"] = (now, self._query(4, self.provider.get_virtual_screen))
+                self._monitors.clear()
+            return screen[1]
+
+    def window_list(self, refresh=False):
+        with self._lock:
+            self.requested += 1
+            now = self.clock()
+            wins = self._cached.get("windows")
+            if refresh or wins is None or now - wins[0] > self.list_ttl:
+                wins = self._cached["windows"] = (now, sorted(self._query(1, self.provider.enum_windows), key=lambda x: x[1]))
+            return list(wins[1])
+
+    def monitor_for(self, rect):
+        # Clip rect to the virtual screen; the resulting mss monitor dict is
+        # reused for as long as both inputs stay the same.
+        screen = self.virtual_screen()
+        key = tuple(rect)
+        with self._lock:
+            if key in self._monitors:
+                return self._monitors[key]
+            vx, vy, vw, vh = screen
+            rx, ry, rw, rh = key
+            x1 = max(vx, rx)
+            y1 = max(vy, ry)
+            x2 = min(vx + vw, rx + rw)
+            y2 = min(vy + vh, ry + rh)
+            w_new = int(x2 - x1)
+            h_new = int(y2 - y1)
+            monitor = None
+            if w_new > 0 and h_new > 0:
+                monitor = {"left": int(x1), "top": int(y1), "width": w_new, "height": h_new}
+            if len(self._monitors) > 64:
+                self._monitors.clear()
+            self._monitors[key] = monitor
+            return monitor
+
+    def invalidate(self, hwnd=None):
+        with self._lock:
+            if hwnd is None:
+                self._windows.clear()
+                self._cached.clear()
+                self._monitors.clear()
+            else:
+                self._windows.pop(hwnd, None)
+
+    def view(self):
+        # The copy shares the lock and every cache dict; only the counters,
+        # which are rebound rather than mutated, are its own.
+        view = copy.copy(self)
+        view.queries = 0
+        view.requested = 0
+        view.query_time = 0.0
+        return view
+
+    def reset_stats(self):
+        with self._lock:
+            self.queries = 0
+            self.requested = 0
+            self.query_time = 0.0
+
+    def stats(self):
+        with self._lock:
+            saved = max(self.requested - self.queries, 0)
+            per_call = self.query_time / self.queries if self.queries else 0.0
+            return {"requested": self.requested, "queries": self.queries,
+                    "saved": saved, "saved_time": saved * per_call}
+
+GEOMETRY_CACHE = GeometryCache(Win32GeometryProvider())
+
+class WindowUtils:
+    @staticmethod
+    def get_window_list(refresh=False):
+        return GEOMETRY_CACHE.window_list(refresh)
+
+    @staticmethod
+    def get_window_rect(hwnd):
+        try:
+            rect = win32gui.GetWindowRect(hwnd)
+            return rect
+        except:
+            return None
+
+    @staticmethod
+    def background_click(hwnd, x_screen, y_screen):
+        try:
+            point = win32gui.ScreenToClient(hwnd, (x_screen, y_screen))
+            lparam = win32api.MAKELONG(point[0], point[1])
+            win32gui.PostMessage(hwnd, win32con.WM_LBUTTONDOWN, win32con.MK_LBUTTON, lparam)
+            win32gui.PostMessage(hwnd, win32con.WM_LBUTTONUP, 0, lparam)
+        except Exception:
+            pass
+
+class TemplateCache:
+    # Decoded template images shared by every profile, keyed by absolute path
+    # plus mtime and size so an edited file is decoded again.
+    def __init__(self, max_mb=256):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._images = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.decodes = 0
+
+    @staticmethod
+    def _key(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+    def get(self, path):
+        key = self._key(path)
+        if key is None:
+            return None
+        with self._lock:
+            img = self._images.get(key)
+            if img is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return img
+        try:
+            # imdecode raises rather than returning None on an empty file.
+            img = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        except Exception:
+            return None
+        if img is None:
+            return None
+        img.setflags(write=False)
+        with self._lock:
+            self.decodes += 1
+            if key not in self._images:
+                self._images[key] = img
+                self._bytes += img.nbytes
+            while len(self._images) > 1 and self._bytes > self.max_bytes:
+                _, old = self._images.popitem(last=False)
+                self._bytes -= old.nbytes
+        return img
+
+TEMPLATE_CACHE = TemplateCache()
+
+class LazyTemplate(dict):
+    # Template entry whose 'data' is decoded through TEMPLATE_CACHE on first
+    # access, so loading or switching profiles never touches the PNGs.
+    def __missing__(self, key):
+        if key != 'data':
+            raise KeyError(key)
+        img = TEMPLATE_CACHE.get(self['path'])
+        if img is None:
+            raise ValueError(f"Cannot load template {self['path']}")
+        self['data'] = img
+        return img
+
+class ProfileStore:
+    # One JSON file per named profile plus an index holding the active
+    # profile and app-wide settings. Writes go through a temp file and
+    # os.replace, and only profiles whose content changed are rewritten.
+    INDEX = "_index.json"
+
+    def __init__(self, folder=PROFILES_DIR):
+        self.folder = folder
+        self._profiles = {}
+        self._written = {}
+        self._files = {}
+        self.index = {"active": "Default", "app": {}}
+        os.makedirs(folder, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        for fname in os.listdir(self.folder):
+            if not fname.endswith(".json"):
+                continue
+            path = os.path.join(self.folder, fname)
+            try:
+                with open(path, "r", encoding="utf-8") as f: raw = f.read()
+                data = json.loads(raw)
+            except Exception:
+                continue
+            if fname == self.INDEX:
+                self.index.update(data)
+            elif isinstance(data, dict) and data.get("name"):
+                name = data.pop("name")
+                self._profiles[name] = data
+                self._files[name] = path
+                self._written[path] = raw
+
+    def _path(self, name):
+        path = self._files.get(name)
+        if path is None:
+            slug = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in name)[:40]
+            digest = hashlib.md5(name.encode("utf-8")).hexdigest()[:8]
+            path = self._files[name] = os.path.join(self.folder, f"{slug}_{digest}.json")
+        return path
+
+    def _write(self, path, data):
+        raw = json.dumps(data, indent=2, ensure_ascii=False)
+        if self._written.get(path) == raw:
+            return False
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f: f.write(raw)
+        os.replace(tmp, path)
+        self._written[path] = raw
+        return True
+
+    def import_legacy(self, path):
+        # Seeds an empty store from the single settings file of older
+        # versions, or with an empty 'Default' profile. Returns True if the
+        # store was seeded.
+        if self._profiles:
+            return False
+        legacy = {}
+        try:
+            if os.path.exists(path):
+                with open(path, "r") as f: legacy = json.load(f)
+        except Exception:
+            legacy = {}
+        if not isinstance(legacy, dict):
+            legacy = {}
+        if "lang" in legacy:
+            self.set_app_setting("lang", legacy.pop("lang"))
+        self.save("Default", legacy)
+        return True
+
+    def names(self):
+        return sorted(self._profiles, key=str.lower)
+
+    def load(self, name):
+        return dict(self._profiles.get(name, {}))
+
+    def save(self, name, settings):
+        self._profiles[name] = dict(settings)
+        return self._write(self._path(name), dict(settings, name=name))
+
+    def delete(self, name):
+        self._profiles.pop(name, None)
+        path = self._files.pop(name, None)
+        if path:
+            self._written.pop(path, None)
+            try: os.remove(path)
+            except OSError: pass
+
+    @property
+    def active(self):
+        return self.index.get("active", "Default")
+
+    def set_active(self, name):
+        self.index["active"] = name
+        self.save_index()
+
+    def app_setting(self, key, default=None):
+        return self.index.get("app", {}).get(key, default)
+
+    def set_app_setting(self, key, value):
+        self.index.setdefault("app", {})[key] = value
+        self.save_index()
+
+    def save_index(self):
+        try: self._write(os.path.join(self.folder, self.INDEX), self.index)
+        except OSError: pass
+
+class MatchCache:
+    # LRU of captured-frame hash -> {template hash: (score, loc)}. UIs that
+    # cycle through the same few screens skip matchTemplate entirely on a hit.
+    # "exact" hashes every pixel; "perceptual" hashes a coarse 32x32 gray
+    # thumbnail and trades exactness for hits on near-identical frames.
+    ENTRY_BYTES = 160
+    RESULT_BYTES = 120
+
+    def __init__(self, max_entries=256, max_mb=4.0, mode="exact", verify_rate=0.0, path=None):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.mode = mode
+        self.verify_rate = verify_rate
+        self.path = path
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.verified = 0
+        self.mismatches = 0
+
+    @staticmethod
+    def template_key(templ):
+        key = templ.get('hash')
+        if key is None:
+            data = np.ascontiguousarray(templ['data'])
+            h = hashlib.blake2b(memoryview(data).cast("B"), digest_size=12)
+            h.update(str(data.shape).encode())
+            key = templ['hash'] = h.hexdigest()
+        return key
+
+    def frame_key(self, img):
+        if self.mode == "perceptual":
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            thumb = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA) >> 3
+            data = np.ascontiguousarray(thumb)
+        else:
+            data = np.ascontiguousarray(img)
+        h = hashlib.blake2b(memoryview(data).cast("B"), digest_size=16)
+        h.update(str(img.shape).encode())
+        return h.hexdigest()
+
+    def get(self, fkey, tkey):
+        entry = self._entries.get(fkey)
+        if entry is not None and tkey in entry:
+            self._entries.move_to_end(fkey)
+            self.hits += 1
+            return entry[tkey]
+        self.misses += 1
+        return None
+
+    def put(self, fkey, tkey, score, loc):
+        entry = self._entries.get(fkey)
+        if entry is None:
+            entry = self._entries[fkey] = {}
+            self._bytes += self.ENTRY_BYTES
+        else:
+            self._entries.move_to_end(fkey)
+        if tkey not in entry:
+            self._bytes += self.RESULT_BYTES
+        entry[tkey] = (float(score), (int(loc[0]), int(loc[1])))
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= self.ENTRY_BYTES + self.RESULT_BYTES * len(old)
+            self.evictions += 1
+
+    def should_verify(self):
+        return self.verify_rate > 0 and random.random() < self.verify_rate
+
+    def record_verify(self, cached, actual):
+        self.verified += 1
+        if abs(cached[0] - actual[0]) > 1e-3 or tuple(cached[1]) != tuple(actual[1]):
+            self.mismatches += 1
+            return False
+        return True
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f: data = json.load(f)
+            if data.get("mode") != self.mode:
+                return
+            for fkey, entry in data.get("entries", []):
+                for tkey, (score, x, y) in entry.items():
+                    self.put(fkey, tkey, score, (x, y))
+        except Exception:
+            self.clear()
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        try:
+            entries = [[fkey, {tkey: [v[0], v[1][0], v[1][1]] for tkey, v in entry.items()}]
+                       for fkey, entry in self._entries.items()]
+            with open(tmp, "w") as f: json.dump({"mode": self.mode, "entries": entries}, f)
+            os.replace(tmp, self.path)
+        except: pass
+
+    def stats(self):
+        return {"entries": len(self._entries), "kb": self._bytes // 1024, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions,
+                "verified": self.verified, "mismatches": self.mismatches}
+
+class TemplateBank:
+    # Finds templates in a list that can share correlation work:
+    #   exact duplicates -- same pixels from different files; MatchEngine
+    #     matches the first and reuses the result for the rest.
+    # With regions=True it also links (see MatchEngine, "dedupe_regions"):
+    #   near-duplicates  -- same size, correlating >= threshold with an
+    #     earlier template; searched first around that template's best spot.
+    #   crops            -- found inside a larger template with score >=
+    #     threshold; searched first around the parent's match.
+    # Region searches are an approximation: a near-duplicate that appears
+    # elsewhere on screen still scores high next to its leader, so the click
+    # can land on the leader's spot. Only exact duplicates are exact.
+    THRESHOLD = 0.97
+    MIN_STD = 2.0
+
+    def __init__(self, templates, threshold=THRESHOLD, regions=False):
+        self.threshold = threshold
+        self.regions = regions
+        self.links = {}
+        self.templates = 0
+        self.duplicates = 0
+        self.near = 0
+        self.crops = 0
+        self._analyze(templates)
+
+    def _analyze(self, templates):
+        entries = []
+        seen = set()
+        for templ in templates:
+            try:
+                img = templ['data']
+                tkey = MatchCache.template_key(templ)
+            except Exception:
+                continue
+            self.templates += 1
+            if tkey in seen:
+                self.duplicates += 1
+                continue
+            seen.add(tkey)
+            entries.append((tkey, img))
+
+        if not self.regions:
+            return
+        for i, (ckey, cimg) in enumerate(entries):
+            ch, cw = cimg.shape[:2]
+            if float(cimg.std()) < self.MIN_STD:
+                continue
+            best = None
+            for j, (pkey, pimg) in enumerate(entries):
+                ph, pw = pimg.shape[:2]
+                if i == j or ch > ph or cw > pw:
+                    continue
+                same = (ch, cw) == (ph, pw)
+                if same and j > i:
+                    continue
+                min_val, score, min_loc, loc = cv2.minMaxLoc(cv2.matchTemplate(pimg, cimg, cv2.TM_CCOEFF_NORMED))
+                if score >= self.threshold and (best is None or score > best[0]):
+                    best = (score, pkey, loc, "near" if same else "crop")
+            if best is not None:
+                self.links[ckey] = (best[1], best[2], best[3])
+                if best[3] == "near": self.near += 1
+                else: self.crops += 1
+
+    def describe(self):
+        return (f"Template bank: {self.templates} templates, {self.duplicates} exact duplicates, "
+                f"{self.near} near-duplicates, {self.crops} crops")
+
+class MatchEngine:
+    # Template matching and click decisions for one captured frame, kept free
+    # of Qt and input side effects so sessions can be replayed headlessly.
+    #
+    # With "skip_idle_frames" on (the default), frames where the click
+    # interval has not elapsed yet cannot click at all and are not matched
+    # unless the debug overlay or an event subscriber needs the scores.
+    #
+    # With "dedupe" on, exact duplicates in the template list reuse one
+    # correlation per frame. "dedupe_regions" (off by default, since it can
+    # change where a click lands) additionally searches near-duplicates and
+    # crops around their parent's match first, falling back to a full search
+    # whenever that region scores below confidence (see TemplateBank).
+    _ids = itertools.count(1)
+
+    def __init__(self, config, templates, match_cache=None, events=None):
+        self.id = next(MatchEngine._ids)
+        self.config = config
+        self.templates = templates
+        self.match_cache = match_cache
+        self.events = events
+        self.last_click_time = 0
+        self.bank = None
+        self._bank_sig = None
+        # ids of templates left out of this run (e.g. the image failed to
+        # load) without touching their saved 'enabled' flag.
+        self.skip = set()
+        self.stats = {"frames": 0, "reached": 0, "full": 0, "cache_hits": 0, "gated": 0,
+                      "shared": 0, "roi": 0}
+
+    def _match(self, img_bgr, templ, frame_key):
+        cache = self.match_cache
+        tkey = MatchCache.template_key(templ)
+        cached = None
+        if cache is not None and frame_key is not None:
+            cached = cache.get(frame_key, tkey)
+            if cached is not None and not cache.should_verify():
+                self.stats["cache_hits"] += 1
+                return cached
+
+        self.stats["full"] += 1
+        res = cv2.matchTemplate(img_bgr, templ['data'], cv2.TM_CCOEFF_NORMED)
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
+        if cache is not None and frame_key is not None:
+            if cached is not None:
+                cache.record_verify(cached, (max_val, max_loc))
+            cache.put(frame_key, tkey, max_val, max_loc)
+        return max_val, max_loc
+
+    def analyze(self):
+        # (Re)builds the TemplateBank when the template list changed.
+        if not self.config.get('dedupe', True):
+            self.bank = None
+            return None
+        regions = self.config.get('dedupe_regions', False)
+        threshold = self.config.get('dedupe_threshold', TemplateBank.THRESHOLD)
+        sig = (tuple(id(t) for t in self.templates), regions, threshold)
+        if sig != self._bank_sig:
+            self.bank = TemplateBank(self.templates, threshold, regions)
+            self._bank_sig = sig
+        return self.bank
+
+    def _evaluate(self, img_bgr, templ, frame_key, memo):
+        tkey = MatchCache.template_key(templ)
+        if self.bank is None:
+            return self._match(img_bgr, templ, frame_key)
+        if tkey in memo:
+            self.stats["shared"] += 1
+            return memo[tkey]
+        link = self.bank.links.get(tkey)
+        if link is not None:
+            parent_key, (ox, oy), kind = link
+            parent = memo.get(parent_key)
+            if parent is not None:
+                result = self._match_roi(img_bgr, templ['data'], parent[1][0] + ox, parent[1][1] + oy)
+                # A region that misses proves nothing about the rest of the
+                # frame, so only a hit is kept.
+                if result is not None and result[0] >= self.config.get('confidence', 0.8):
+                    self.stats["roi"] += 1
+                    memo[tkey] = result
+                    return result
+        result = memo[tkey] = self._match(img_bgr, templ, frame_key)
+        return result
+
+    @staticmethod
+    def _match_roi(img_bgr, template_img, x, y, pad=2):
+        h, w = template_img.shape[:2]
+        fh, fw = img_bgr.shape[:2]
+        x1, y1 = max(0, x - pad), max(0, y - pad)
+        x2, y2 = min(fw, x + w + pad), min(fh, y + h + pad)
+        if x2 - x1 < w or y2 - y1 < h:
+            return None
+        res = cv2.matchTemplate(img_bgr[y1:y2, x1:x2], template_img, cv2.TM_CCOEFF_NORMED)
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
+        return max_val, (x1 + max_loc[0], y1 + max_loc[1])
+
+    def summary(self):
+        st = self.stats
+        frames = st["frames"] or 1
+        return (f"Matching: {st['full'] / frames:.2f} templates fully matched per frame "
+                f"(was {st['reached'] / frames:.2f}), {st['cache_hits']} cache hits, {st['gated']} gated frames; "
+                f"template bank: {st['shared'] / frames:.2f} shared and {st['roi'] / frames:.2f} "
+                f"region-restricted matches per frame")
+
+    def process(self, img_bgr, now, monitor_offset=(0, 0), on_click=None, is_running=None):
+        # on_click(templ, x, y, score) performs the click and may return False
+        # to abandon the rest of the frame (e.g. the target window moved).
+        debug = self.config.get('debug', False)
+        self.stats["frames"] += 1
+        listening = self.events is not None and self.events.has_subscribers
+        if (self.config.get('skip_idle_frames', True) and not debug and not listening
+                and now - self.last_click_time < self.config.get('interval', 1.0)):
+            self.stats["gated"] += 1
+            self.stats["reached"] += sum(1 for t in self.templates if t.get('enabled', True) and id(t) not in self.skip)
+            return {"scores": [], "clicks": [], "canvas": None, "gated": True}
+
+        frame_key = self.match_cache.frame_key(img_bgr) if self.match_cache is not None else None
+        canvas = img_bgr.copy() if debug else None
+        result = {"scores": [], "clicks": [], "canvas": canvas}
+        matches = []
+        memo = {}
+        self.analyze()
+        found_click_this_frame = False
+
+        for templ in self.templates:
+            if is_running is not None and not is_running(): break
+            if not self.config.get('multi_click') and found_click_this_frame: break
+
+            if not templ.get('enabled', True) or id(templ) in self.skip:
+                continue
+
+            template_img = templ['data']
+            h, w = template_img.shape[:2]
+
+            self.stats["reached"] += 1
+            max_val, max_loc = self._evaluate(img_bgr, templ, frame_key, memo)
+            threshold = self.config.get('confidence', 0.8)
+            result["scores"].append([templ['name'], round(float(max_val), 4), int(max_loc[0]), int(max_loc[1])])
+            
+            if debug:
+                top_left = max_loc
+                bottom_right = (top_left[0] + w, top_left[1] + h)
+                color = (0, 0, 255) 
+                if max_val >= threshold:
+                    color = (0, 255, 0)
+                
+                cv2.rectangle(canvas, top_left, bottom_right, color, 2)
+                cv2.putText(canvas, f"{max_val:.2f}", (top_left[0], top_left[1]-5), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
+
+            if max_val >= threshold:
+                final_x = monitor_offset[0] + max_loc[0] + w // 2
+                final_y = monitor_offset[1] + max_loc[1] + h // 2
+                event = {"type": "match", "t": now, "template": templ['name'], "score": round(float(max_val), 4),
+                         "x": int(final_x), "y": int(final_y), "clicked": False}
+                matches.append(event)
+
+                if now - self.last_click_time >= self.config.get('interval', 1.0):
+                    if on_click is not None and on_click(templ, final_x, final_y, max_val) is False:
+                        break
+
+                    result["clicks"].append([templ['name'], int(final_x), int(final_y)])
+                    event["clicked"] = True
+                    self.last_click_time = now
+                    found_click_this_frame = True
+
+        if listening and matches:
+            target = self.target()
+            for event in matches:
+                event["engine"] = self.id
+                event["target"] = target
+            self.events.publish_many(matches)
+        return result
+
+    def target(self):
+        # What this engine watches: {"hwnd": ...} or {"region": [x, y, w, h]}.
+        hwnd = self.config.get('target_hwnd', 0)
+        if self.config.get('use_window', False) and hwnd:
+            return {"hwnd": hwnd}
+        region = self.config.get('region')
+        return {"region": list(region)} if region else None
+
+# Profile keys handed to MatchEngine unchanged; the keys bound to controls in
+# the main window are filled in by the GUI itself.
+ENGINE_SETTINGS = ("skip_idle_frames", "dedupe", "dedupe_regions", "dedupe_threshold")
+
+def engine_config(settings, cfg):
+    # Run config for one start: the profile's engine keys overlaid with cfg.
+    out = {k: settings[k] for k in ENGINE_SETTINGS if k in settings}
+    out.update(cfg)
+    return out
+
+class SessionRecorder:
+    # Streams frames, match scores and click decisions to a session file from
+    # a writer thread. The frame loop only enqueues references; when the
+    # bounded queue is full the frame is dropped rather than stalling capture.
+    # Unchanged frames are stored as a marker, changed ones as a PNG of the
+    # bounding box of the pixels that differ from the previous frame. The
+    # file is flushed every flush_interval seconds, so a killed run leaves a
+    # readable (if truncated) recording.
+    MAGIC = b"ACSREC1\n"
+    HEADER = struct.Struct("<cII")
+
+    def __init__(self, path, max_queue=8, full_frame_ratio=0.5, png_level=1, flush_interval=1.0):
+        self.path = path
+        self.full_frame_ratio = full_frame_ratio
+        self.png_level = png_level
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._file = None
+        self._prev = None
+        self.frames = 0
+        self.dropped = 0
+        self.bytes_written = 0
+
+    def start(self, config, templates):
+        folder = os.path.dirname(self.path)
+        if folder: os.makedirs(folder, exist_ok=True)
+        self._file = open(self.path, "wb")
+        self._file.write(self.MAGIC)
+        self._write(b"C", {"config": config, "started": time.time()})
+        for templ in templates:
+            try:
+                ok, png = cv2.imencode(".png", templ['data'])
+            except Exception:
+                ok = False
+            self._write(b"T", {"name": templ['name'], "path": templ.get('path'),
+                               "enabled": templ.get('enabled', True)}, png.tobytes() if ok else b"")
+        self._file.flush()
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    def add_frame(self, t, img_bgr, monitor_offset, result):
+        meta = {"t": t, "offset": list(monitor_offset), "scores": result["scores"], "clicks": result["clicks"]}
+        try:
+            self._queue.put_nowait((meta, img_bgr))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+
+    def _writer(self):
+        last_flush = time.monotonic()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            meta, img = item
+            try:
+                blob = self._encode(meta, img)
+                self._write(b"F", meta, blob)
+                self.frames += 1
+            except Exception:
+                self.dropped += 1
+                continue
+            # Only a frame the reader will see can be the base of the next diff.
+            self._prev = img
+            if time.monotonic() - last_flush >= self.flush_interval:
+                try: self._file.flush()
+                except OSError: pass
+                last_flush = time.monotonic()
+
+    def _encode(self, meta, img):
+        prev = self._prev
+        if prev is not None and prev.shape == img.shape:
+            changed = np.any(prev != img, axis=2)
+            rows = np.flatnonzero(changed.any(axis=1))
+            if rows.size == 0:
+                meta["frame"] = "same"
+                return b""
+            cols = np.flatnonzero(changed.any(axis=0))
+            y1, y2, x1, x2 = int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1
+            if (y2 - y1) * (x2 - x1) < self.full_frame_ratio * changed.size:
+                meta["frame"] = "patch"
+                meta["box"] = [x1, y1]
+                img = img[y1:y2, x1:x2]
+        meta.setdefault("frame", "full")
+        ok, png = cv2.imencode(".png", img, [cv2.IMWRITE_PNG_COMPRESSION, self.png_level])
+        if not ok:
+            raise ValueError("PNG encoding failed")
+        return png.tobytes()
+
+    def _write(self, kind, meta, blob=b""):
+        data = json.dumps(meta, default=str).encode()
+        self._file.write(self.HEADER.pack(kind, len(data), len(blob)))
+        self._file.write(data)
+        self._file.write(blob)
+        self.bytes_written += self.HEADER.size + len(data) + len(blob)
+
+class SessionReader:
+    # A recording cut short by a crash ends in a partial record; reading
+    # stops there and sets truncated. Frames that can't be decoded, and
+    # patches without a decoded base frame, are skipped until the next full
+    # frame.
+    def __init__(self, path):
+        self.path = path
+        self.config = {}
+        self.templates = []
+        self.truncated = False
+        self.skipped = 0
+
+    def records(self):
+        with open(self.path, "rb") as f:
+            if f.read(len(SessionRecorder.MAGIC)) != SessionRecorder.MAGIC:
+                raise ValueError(f"Not a session file: {self.path}")
+            header = SessionRecorder.HEADER
+            while True:
+                raw = f.read(header.size)
+                if len(raw) < header.size:
+                    self.truncated = len(raw) > 0
+                    break
+                kind, json_len, blob_len = header.unpack(raw)
+                data = f.read(json_len)
+                blob = f.read(blob_len)
+                if len(data) < json_len or len(blob) < blob_len:
+                    self.truncated = True
+                    break
+                try:
+                    meta = json.loads(data)
+                except ValueError:
+                    self.truncated = True
+                    break
+                yield kind, meta, blob
+
+    def frames(self):
+        # Yields (meta, img_bgr) with patches applied to the previous frame.
+        frame = None
+        for kind, meta, blob in self.records():
+            if kind == b"C":
+                self.config = meta.get("config", {})
+            elif kind == b"T":
+                img = cv2.imdecode(np.frombuffer(blob, np.uint8), cv2.IMREAD_COLOR) if blob else None
+                if img is not None:
+                    self.templates.append({"path": meta.get("path"), "name": meta["name"],
+                                           "data": img, "enabled": meta.get("enabled", True)})
+            elif kind == b"F":
+                mode = meta.get("frame", "full")
+                if mode != "same":
+                    img = cv2.imdecode(np.frombuffer(blob, np.uint8), cv2.IMREAD_COLOR) if blob else None
+                    if mode == "patch":
+                        x, y = meta.get("box", (0, 0))
+                        if (img is None or frame is None or y + img.shape[0] > frame.shape[0]
+                                or x + img.shape[1] > frame.shape[1]):
+                            frame = None
+                        else:
+                            frame = frame.copy()
+                            frame[y:y + img.shape[0], x:x + img.shape[1]] = img
+                    else:
+                        frame = img
+                if frame is None:
+                    self.skipped += 1
+                    continue
+                yield meta, frame
+
+def replay_session(path, config=None, templates=None, match_cache=None):
+    # Feeds a recorded session through MatchEngine as fast as possible and
+    # diffs click decisions. config/templates override the recorded ones,
+    # e.g. to test a new threshold against yesterday's session.
+    reader = SessionReader(path)
+    engine = None
+    report = {"frames": 0, "clicks": 0, "diffs": [], "max_score_delta": 0.0,
+              "recorded_seconds": 0.0, "replay_seconds": 0.0}
+    first_t = last_t = None
+    t0 = time.perf_counter()
+    for meta, img in reader.frames():
+        if engine is None:
+            cfg = dict(reader.config)
+            cfg.update(config or {})
+            cfg['debug'] = False
+            engine = MatchEngine(cfg, templates if templates is not None else reader.templates, match_cache)
+        if img is None:
+            continue
+        result = engine.process(img, meta["t"], meta["offset"])
+        report["frames"] += 1
+        report["clicks"] += len(result["clicks"])
+        recorded = {s[0]: s[1] for s in meta["scores"]}
+        for name, score, x, y in result["scores"]:
+            if score is not None and recorded.get(name) is not None:
+                report["max_score_delta"] = max(report["max_score_delta"], abs(score - recorded[name]))
+        if result["clicks"] != meta["clicks"]:
+            report["diffs"].append({"frame": report["frames"], "t": meta["t"],
+                                    "recorded": meta["clicks"], "replayed": result["clicks"]})
+        if first_t is None: first_t = meta["t"]
+        last_t = meta["t"]
+    report["replay_seconds"] = time.perf_counter() - t0
+    report["truncated"] = reader.truncated
+    report["skipped"] = reader.skipped
+    if first_t is not None:
+        report["recorded_seconds"] = last_t - first_t
+    return report
+
+class MatchSubscription:
+    # Bounded per-consumer buffer. push() is called from the frame loop and
+    # never blocks: once max_pending events are waiting, the oldest are
+    # dropped and counted, so a slow consumer only loses its own events.
+    def __init__(self, bus, max_pending=1024):
+        self.bus = bus
+        self._items = deque(maxlen=max_pending)
+        self._cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+        self.delivered = 0
+
+    def push(self, events):
+        with self._cond:
+            overflow = len(self._items) + len(events) - self._items.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+            self._items.extend(events)
+            self._cond.notify()
+
+    def get_batch(self, max_items=256, timeout=None):
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait(timeout)
+            n = min(max_items, len(self._items))
+            batch = [self._items.popleft() for _ in range(n)]
+            self.delivered += n
+            return batch
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        self.bus._remove(self)
+
+    def expired(self):
+        return self.closed
+
+class AsyncMatchSubscription(MatchSubscription):
+    # `async for event in bus.events():` -- wakeups are coalesced into one
+    # call_soon_threadsafe per burst instead of one per event. Use
+    # `async with bus.events() as events:` or aclose() to unsubscribe
+    # deterministically; the bus only holds a weak reference, so breaking
+    # out of the loop also unsubscribes once the object is collected, and a
+    # subscription whose loop has closed closes itself on the next publish.
+    def __init__(self, bus, loop, max_pending=1024):
+        super().__init__(bus, max_pending)
+        self.loop = loop
+        self._waiter = None
+        self._wake_pending = False
+
+    def push(self, events):
+        if self.loop.is_closed():
+            self.close()
+            return
+        with self._cond:
+            overflow = len(self._items) + len(events) - self._items.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+            self._items.extend(events)
+            schedule = self._waiter is not None and not self._wake_pending
+            if schedule:
+                self._wake_pending = True
+        if schedule:
+            try: self.loop.call_soon_threadsafe(self._wake)
+            except RuntimeError: self.close()
+
+    def expired(self):
+        if not self.closed and self.loop.is_closed():
+            self.close()
+        return self.closed
+
+    def _wake(self):
+        with self._cond:
+            self._wake_pending = False
+            waiter, self._waiter = self._waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def close(self):
+        super().close()
+        try: self.loop.call_soon_threadsafe(self._wake)
+        except RuntimeError: pass
+
+    async def aclose(self):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        batch = await self.next_batch(1)
+        if not batch:
+            raise StopAsyncIteration
+        return batch[0]
+
+    async def next_batch(self, max_items=256):
+        # Returns [] once the subscription is closed and drained.
+        while True:
+            with self._cond:
+                if self._items:
+                    n = min(max_items, len(self._items))
+                    self.delivered += n
+                    return [self._items.popleft() for _ in range(n)]
+                if self.closed:
+                    return []
+                self._waiter = self.loop.create_future()
+                waiter = self._waiter
+            await waiter
+
+class MatchEventBus:
+    # Public in-process API for reacting to matches without the GUI:
+    #
+    #     sub = MATCH_EVENTS.subscribe(lambda ev: print(ev))
+    #     async for ev in MATCH_EVENTS.events(): ...
+    #
+    # Events are dicts: type, seq, t, template, score, x, y (screen centre of
+    # the match), clicked, engine (MatchEngine.id of the publisher) and
+    # target (MatchEngine.target()), so several engines can share a bus.
+    # Every subscriber gets its own copies. Callbacks run on a thread per
+    # subscriber. Subscriptions are held weakly; callback and socket
+    # subscriptions are kept alive by their threads until closed.
+    def __init__(self):
+        # Reentrant: a weakref callback can fire while the lock is held.
+        self._lock = threading.RLock()
+        self._subs = ()
+        self._seq = itertools.count(1)
+        self.published = 0
+
+    @property
+    def has_subscribers(self):
+        return any(sub is not None and not sub.expired() for sub in (ref() for ref in self._subs))
+
+    def publish(self, event):
+        self.publish_many([event])
+
+    def publish_many(self, events):
+        subs = [sub for sub in (ref() for ref in self._subs) if sub is not None]
+        if not subs:
+            return
+        events = [dict(ev, seq=next(self._seq)) for ev in events]
+        self.published += len(events)
+        for i, sub in enumerate(subs):
+            sub.push(events if i == 0 else [dict(ev) for ev in events])
+
+    def _add(self, sub):
+        with self._lock:
+            self._subs = self._subs + (weakref.ref(sub, self._discard),)
+        return sub
+
+    def _discard(self, ref):
+        with self._lock:
+            self._subs = tuple(r for r in self._subs if r is not ref)
+
+    def _remove(self, sub):
+        with self._lock:
+            self._subs = tuple(r for r in self._subs if r() is not sub and r() is not None)
+
+    def subscription(self, max_pending=1024):
+        return self._add(MatchSubscription(self, max_pending))
+
+    def subscribe(self, callback, batch=False, max_pending=1024):
+        # callback(event), or callback([events]) with batch=True.
+        sub = self.subscription(max_pending)
+        def pump():
+            while True:
+                events = sub.get_batch(timeout=0.5)
+                if not events:
+                    if sub.closed: break
+                    continue
+                try:
+                    if batch:
+                        callback(events)
+                    else:
+                        for ev in events: callback(ev)
+                except Exception:
+                    traceback.print_exc()
+        threading.Thread(target=pump, daemon=True).start()
+        return sub
+
+    def events(self, max_pending=1024, loop=None):
+        loop = loop or asyncio.get_running_loop()
+        return self._add(AsyncMatchSubscription(self, loop, max_pending))
+
+MATCH_EVENTS = MatchEventBus()
+
+class MatchEventServer:
+    # Streams MATCH_EVENTS to local clients as newline-delimited JSON. Uses a
+    # Unix socket where the platform has AF_UNIX and a path is given,
+    # otherwise a loopback TCP port. Each client has its own bounded
+    # subscription and writer thread, so a stalled reader drops its own
+    # backlog instead of slowing the frame loop or other clients.
+    def __init__(self, bus, path=None, host="127.0.0.1", port=0, max_pending=4096):
+        self.bus = bus
+        self.path = path if path and hasattr(socket, "AF_UNIX") else None
+        self.host = host
+        self.port = port
+        self.max_pending = max_pending
+        self._sock = None
+        self._clients = set()
+        self._lock = threading.Lock()
+
+    @property
+    def address(self):
+        return self.path or f"{self.host}:{self.port}"
+
+    def start(self):
+        if self.path:
+            if os.path.exists(self.path): os.remove(self.path)
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.bind(self.path)
+        else:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._sock.bind((self.host, self.port))
+            self.port = self._sock.getsockname()[1]
+        self._sock.listen(8)
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                break
+            sub = self.bus.subscription(self.max_pending)
+            with self._lock:
+                self._clients.add((conn, sub))
+            threading.Thread(target=self._serve, args=(conn, sub), daemon=True).start()
+
+    def _serve(self, conn, sub):
+        try:
+            while not sub.closed:
+                batch = sub.get_batch(timeout=0.5)
+                if batch:
+                    conn.sendall("".join(json.dumps(ev) + "\n" for ev in batch).encode())
+        except OSError:
+            pass
+        finally:
+            sub.close()
+            with self._lock:
+                self._clients.discard((conn, sub))
+            try: conn.close()
+            except OSError: pass
+
+    def stop(self):
+        if self._sock is not None:
+            try: self._sock.close()
+            except OSError: pass
+            self._sock = None
+        with self._lock:
+            clients = list(self._clients)
+        for conn, sub in clients:
+            sub.close()
+            try: conn.shutdown(socket.SHUT_RDWR)
+            except OSError: pass
+        if self.path and os.path.exists(self.path):
+            try: os.remove(self.path)
+            except OSError: pass
+
+class FrameSource:
+    # Captures an mss-style monitor dict ({left, top, width, height}) as BGR.
+    def grab(self, monitor):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class MssFrameSource(FrameSource):
+    # mss handles are bound to the creating thread, so the engine calls
+    # grab() and close() from its single capture thread only.
+    def __init__(self):
+        self._sct = None
+
+    def grab(self, monitor):
+        if self._sct is None:
+            import mss
+            self._sct = mss.mss()
+        return cv2.cvtColor(np.array(self._sct.grab(monitor)), cv2.COLOR_BGRA2BGR)
+
+    def close(self):
+        if self._sct is not None:
+            self._sct.close()
+            self._sct = None
+
+class FakeFrameSource(FrameSource):
+    # Replays a fixed list of BGR frames in a loop, for headless runs.
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.grabs = 0
+
+    def grab(self, monitor):
+        img = self.frames[self.grabs % len(self.frames)]
+        self.grabs += 1
+        return img
+
+def default_click(x, y, hwnd=0, background=False):
+    if background and hwnd:
+        WindowUtils.background_click(hwnd, x, y)
+    else:
+        import pyautogui
+        pyautogui.FAILSAFE = True
+        pyautogui.click(x=x, y=y)
+
+class AsyncClickerEngine:
+    # asyncio core of the clicker. Capture and matching run on a private
+    # single-thread executor (mss needs a fixed thread), pacing uses
+    # asyncio.sleep, and stop() cancels the frame task and awaits cleanup.
+    # Several engines can share one event loop.
+    #
+    #     core = AsyncClickerEngine(cfg, templates)
+    #     await core.start()
+    #     ...
+    #     await core.stop()
+    def __init__(self, config, templates, frame_source=None, geometry=None, match_cache=None,
+                 recorder=None, events=MATCH_EVENTS, clicker=default_click,
+                 on_log=None, on_click=None, on_frame=None, frame_time=0.033):
+        self.config = config
+        self.templates = templates
+        self.frame_source = frame_source or MssFrameSource()
+        self.geometry = (geometry or GEOMETRY_CACHE).view()
+        self.match_cache = match_cache
+        self.recorder = recorder
+        self.clicker = clicker
+        self.on_log = on_log
+        self.on_click = on_click
+        self.on_frame = on_frame
+        self.frame_time = frame_time
+        self.engine = MatchEngine(config, templates, match_cache, events)
+        self.id = self.engine.id
+        self.frames = 0
+        self._stopping = False
+        self._task = None
+        self._executor = None
+
+    def _log(self, msg):
+        if self.on_log is not None:
+            self.on_log(msg)
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._stopping = False
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        self.request_stop()
+        await self.wait()
+
+    def request_stop(self):
+        # Must be called on the engine's loop; use call_soon_threadsafe otherwise.
+        self._stopping = True
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    async def wait(self):
+        # Shielded, so cancelling the caller (e.g. wait_for timing out) never
+        # cancels the engine; the caller's own CancelledError is re-raised.
+        task = self._task
+        if task is None:
+            return
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+            # Both cancelled at once; Task.cancelling() is 3.11+.
+            current = asyncio.current_task()
+            if hasattr(current, "cancelling") and current.cancelling():
+                raise
+
+    def _prepare(self):
+        target_hwnd = self.config.get('target_hwnd', 0)
+        use_window = self.config.get('use_window', False) and target_hwnd != 0
+        if use_window:
+            self.geometry.invalidate(target_hwnd)
+        self.engine.skip.clear()
+        for templ in self.templates:
+            if templ.get('enabled', True):
+                try:
+                    templ['data']
+                except Exception as e:
+                    # The list is shared with the GUI, which saves 'enabled';
+                    # a missing file only drops the template from this run.
+                    self.engine.skip.add(id(templ))
+                    self._log(f"Error loading {templ['path']}: {e}")
+        bank = self.engine.analyze()
+        if bank is not None and (bank.duplicates or bank.links):
+            self._log(bank.describe())
+        if self.recorder is not None:
+            try:
+                self.recorder.start(self.config, self.templates)
+            except Exception as e:
+                self._log(f"Recorder error: {e}")
+                self.recorder = None
+
+    def _step(self):
+        # One frame. Returns the delay before the next frame, 0 for normal
+        # pacing, or None when the run should end.
+        target_hwnd = self.config.get('target_hwnd', 0)
+        use_window = self.config.get('use_window', False) and target_hwnd != 0
+        current_rect = None
+        window_rect = None
+
+        if use_window:
+            window_rect, iconic = self.geometry.window_state(target_hwnd)
+            if iconic:
+                return 1.0
+
+            rect = window_rect
+            if not rect:
+                self._log("Target window lost or closed.")
+                return None
+
+            rel_Region = self.config.get("relative_region")
+            if rel_Region:
+                current_rect = (rect[0] + rel_Region[0], rect[1] + rel_Region[1], rel_Region[2], rel_Region[3])
+            else:
+                current_rect = (rect[0], rect[1], rect[2]-rect[0], rect[3]-rect[1])
+        else:
+            current_rect = self.config.get('region')
+
+        monitor = self.geometry.monitor_for(current_rect) if current_rect else None
+        if not monitor:
+            return 0.1
+        monitor_offset = (monitor["left"], monitor["top"])
+
+        self.frames += 1
+        img_bgr = self.frame_source.grab(monitor)
+
+        def on_click(templ, final_x, final_y, score):
+            if self._stopping:
+                return False
+            if use_window:
+                # Cached rect may be up to rect_ttl old; confirm before clicking.
+                self.geometry.invalidate(target_hwnd)
+                if self.geometry.window_rect(target_hwnd) != window_rect:
+                    return False
+
+            if self.on_click is not None:
+                self.on_click(templ['name'], final_x, final_y)
+            self._log(f"Click: {templ['name']} ({score:.2f})")
+
+            background = self.config.get('click_mode', 'Mouse') == 'Background' and use_window
+            self.clicker(final_x, final_y, target_hwnd, background)
+
+        now = time.time()
+        result = self.engine.process(img_bgr, now, monitor_offset, on_click, lambda: not self._stopping)
+        if self.recorder is not None:
+            self.recorder.add_frame(now, img_bgr, monitor_offset, result)
+        if result["canvas"] is not None and self.on_frame is not None:
+            self.on_frame(result["canvas"])
+        return 0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="clicker")
+        self._log(f"Worker started. Mode: {self.config.get('click_mode')}")
+        try:
+            await loop.run_in_executor(self._executor, self._prepare)
+            while not self._stopping:
+                loop_start = loop.time()
+                try:
+                    delay = await loop.run_in_executor(self._executor, self._step)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._log(f"Error: {e}")
+                    delay = 1.0
+                if delay is None:
+                    break
+                if not delay:
+                    delay = self.frame_time - (loop.time() - loop_start)
+                await asyncio.sleep(max(0.0, delay))
+        finally:
+            self._stopping = True
+            # Queued behind any frame still running in the executor, so the
+            # source is never closed mid-grab even after cancellation.
+            done = loop.run_in_executor(self._executor, self._finish)
+            try:
+                await asyncio.shield(done)
+            except asyncio.CancelledError:
+                await done
+            self._executor.shutdown(wait=False)
+
+    def _finish(self):
+        try: self.frame_source.close()
+        except Exception: pass
+        self._log(self.engine.summary())
+        st = self.geometry.stats()
+        self._log(f"Geometry cache: {st['saved']}/{st['requested']} OS queries skipped over {self.frames} frames (~{st['saved_time'] * 1000:.1f} ms)")
+        if self.match_cache is not None:
+            self.match_cache.save()
+            mc = self.match_cache.stats()
+            self._log(f"Match cache: {mc['hits']} hits, {mc['misses']} misses, {mc['evictions']} evicted, {mc['entries']} entries ({mc['kb']} KB), {mc['mismatches']}/{mc['verified']} verify mismatches")
+        if self.recorder is not None:
+            self.recorder.stop()
+            self._log(f"Session saved: {self.recorder.path} ({self.recorder.frames} frames, {self.recorder.dropped} dropped, {self.recorder.bytes_written // 1024} KB)")
+
+def replay_main(paths):
+    for path in paths:
+        r = replay_session(path)
+        speed = r["recorded_seconds"] / r["replay_seconds"] if r["replay_seconds"] else 0.0
+        print(f"{path}: {r['frames']} frames, {r['clicks']} clicks, {len(r['diffs'])} decision diffs, "
+              f"max score delta {r['max_score_delta']:.4f}, {speed:.1f}x real time")
+        if r["truncated"] or r["skipped"]:
+            print(f"  truncated: {r['truncated']}, {r['skipped']} undecodable frames skipped")
+        for d in r["diffs"]:
+            print(f"  frame {d['frame']}: recorded {d['recorded']} replayed {d['replayed']}")
+    return 0
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(replay_main(sys.argv[1:]))
@@ -0,0 +1,203 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from clicker_core import (AsyncClickerEngine, FakeFrameSource, FakeGeometryProvider, GeometryCache, LazyTemplate,
+                          ProfileStore, engine_config)
+
+
+def scene():
+    frame = np.random.default_rng(0).integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    templ = {"name": "target", "path": "target.png", "data": frame[40:70, 60:100].copy()}
+    return frame, templ
+
+
+def make_engine(templates, source, clicks, logs, geometry=None, **config):
+    cfg = {"confidence": 0.8, "interval": 0.0, "region": (0, 0, 160, 120)}
+    cfg.update(config)
+    return AsyncClickerEngine(cfg, templates, frame_source=source,
+                              geometry=geometry or GeometryCache(FakeGeometryProvider()), events=None,
+                              clicker=lambda x, y, hwnd=0, background=False: clicks.append((x, y)),
+                              on_log=logs.append, frame_time=0.001)
+
+
+async def run_until(core, cond, timeout=5.0):
+    await core.start()
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not cond() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.005)
+    await core.stop()
+
+
+def test_unloadable_template_is_skipped_without_disabling_it(tmp_path):
+    frame, templ = scene()
+    missing = LazyTemplate({"name": "gone", "path": str(tmp_path / "gone.png"), "enabled": True})
+    clicks, logs = [], []
+    core = make_engine([missing, templ], FakeFrameSource([frame]), clicks, logs)
+    asyncio.run(run_until(core, lambda: clicks))
+    assert clicks and clicks[0] == (80, 55)
+    assert missing["enabled"] is True
+    assert any("Error loading" in m for m in logs)
+
+
+class SlowFrameSource(FakeFrameSource):
+    # Blocks inside grab() until released, to stop the engine mid-frame.
+    def __init__(self, frames):
+        super().__init__(frames)
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.in_grab = False
+        self.closed_in_grab = None
+
+    def grab(self, monitor):
+        self.in_grab = True
+        self.entered.set()
+        self.release.wait(5)
+        self.in_grab = False
+        return super().grab(monitor)
+
+    def close(self):
+        self.closed_in_grab = self.in_grab
+
+
+def count_finish(core):
+    calls = []
+    finish = core._finish
+    core._finish = lambda: (calls.append(1), finish())
+    return calls
+
+
+def test_start_clicks_through_injected_clicker():
+    frame, templ = scene()
+    clicks, logs = [], []
+    core = make_engine([templ], FakeFrameSource([frame]), clicks, logs, interval=0.05)
+
+    async def main():
+        await core.start()
+        assert core.running
+        await asyncio.sleep(0.3)
+        await core.stop()
+
+    asyncio.run(main())
+    assert not core.running
+    assert len(clicks) >= 2 and set(clicks) == {(80, 55)}
+    assert any(m.startswith("Click: target") for m in logs)
+
+
+def test_stop_cancels_mid_frame():
+    frame, templ = scene()
+    clicks, logs = [], []
+    source = SlowFrameSource([frame])
+    core = make_engine([templ], source, clicks, logs)
+    calls = count_finish(core)
+
+    async def main():
+        await core.start()
+        await asyncio.get_running_loop().run_in_executor(None, source.entered.wait, 5)
+        stopping = asyncio.ensure_future(core.stop())
+        await asyncio.sleep(0.05)
+        assert not stopping.done()
+        source.release.set()
+        await asyncio.wait_for(stopping, 5)
+
+    asyncio.run(main())
+    assert core._task.cancelled()
+    assert clicks == []
+    assert source.closed_in_grab is False
+    assert calls == [1]
+
+
+def test_finish_runs_once_however_the_run_ends():
+    frame, templ = scene()
+    clicks, logs = [], []
+    core = make_engine([templ], FakeFrameSource([frame]), clicks, logs)
+    calls = count_finish(core)
+
+    async def stop_twice():
+        await core.start()
+        await asyncio.sleep(0.05)
+        core.request_stop()
+        await asyncio.gather(core.stop(), core.stop(), core.wait())
+
+    asyncio.run(stop_twice())
+    assert calls == [1]
+
+    # The target window is gone, so the run ends on its own.
+    core = make_engine([templ], FakeFrameSource([frame]), clicks, logs, use_window=True, target_hwnd=42)
+    calls = count_finish(core)
+
+    async def window_lost():
+        await core.start()
+        await core.wait()
+        await core.stop()
+
+    asyncio.run(window_lost())
+    assert calls == [1] and "Target window lost or closed." in logs
+
+
+def test_cancelling_the_caller_never_cancels_the_engine():
+    frame, templ = scene()
+    clicks, logs = [], []
+    source = SlowFrameSource([frame])
+    core = make_engine([templ], source, clicks, logs)
+    calls = count_finish(core)
+
+    async def main():
+        await core.start()
+        await asyncio.get_running_loop().run_in_executor(None, source.entered.wait, 5)
+        waiter = asyncio.ensure_future(core.wait())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+        assert waiter.cancelled() and core.running
+        try:
+            await asyncio.wait_for(core.stop(), 0.01)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            raise AssertionError("stop() swallowed the timeout")
+        assert core.running
+        source.release.set()
+        await asyncio.wait_for(core.wait(), 5)
+
+    asyncio.run(main())
+    assert core._task.cancelled() and calls == [1]
+
+
+def test_engines_sharing_a_geometry_cache_keep_their_own_stats():
+    frame, templ = scene()
+    provider = FakeGeometryProvider()
+    provider.set_window(1, "Game", (0, 0, 160, 120))
+    shared = GeometryCache(provider, clock=lambda: 0.0)
+    shared.window_list()
+    shared.virtual_screen()
+    clicks = []
+    window = make_engine([templ], FakeFrameSource([frame]), clicks, [], geometry=shared,
+                         use_window=True, target_hwnd=1)
+    region = make_engine([templ], FakeFrameSource([frame]), [], [], geometry=shared)
+    asyncio.run(run_until(window, lambda: len(clicks) >= 2))
+    before = window.geometry.stats()
+    assert before["queries"] > 0
+    asyncio.run(run_until(region, lambda: region.frames >= 3))
+    assert window.geometry.stats() == before
+    st = region.geometry.stats()
+    assert st["requested"] > 0 and st["queries"] == 0
+    calls = provider.calls
+    shared.window_list()
+    assert provider.calls == calls
+
+
+def test_profile_engine_settings_reach_match_engine(tmp_path):
+    store = ProfileStore(str(tmp_path))
+    store.save("Game", {"region": [0, 0, 160, 120], "skip_idle_frames": False, "lang": "EN"})
+    settings = ProfileStore(str(tmp_path)).load("Game")
+    frame, templ = scene()
+    cfg = engine_config(settings, {"confidence": 0.8, "interval": 1.0, "region": settings["region"]})
+    core = make_engine([templ], FakeFrameSource([frame]), [], [], **cfg)
+    assert core.engine.config["skip_idle_frames"] is False
+    assert "lang" not in core.engine.config
+    assert engine_config({"skip_idle_frames": False}, {"skip_idle_frames": True})["skip_idle_frames"] is True
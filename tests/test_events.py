@@ -0,0 +1,80 @@
+import asyncio
+import gc
+
+import numpy as np
+
+from clicker_core import MatchEngine, MatchEventBus
+
+
+def match(name="a"):
+    return {"type": "match", "template": name, "score": 0.9, "x": 1, "y": 2, "clicked": False}
+
+
+def test_subscribers_get_independent_copies():
+    bus = MatchEventBus()
+    first, second = bus.subscription(), bus.subscription()
+    event = match()
+    bus.publish(event)
+    a, = first.get_batch(timeout=0)
+    b, = second.get_batch(timeout=0)
+    a["template"] = "changed"
+    assert b["template"] == "a" and a["seq"] == b["seq"] == 1
+    assert "seq" not in event
+
+
+def test_breaking_out_of_events_unsubscribes():
+    bus = MatchEventBus()
+
+    async def main():
+        async for ev in bus.events():
+            break
+
+    async def consume():
+        asyncio.get_running_loop().call_soon(bus.publish, match())
+        await main()
+
+    asyncio.run(consume())
+    gc.collect()
+    assert not bus.has_subscribers
+
+
+def test_async_with_closes_the_subscription():
+    bus = MatchEventBus()
+
+    async def main():
+        async with bus.events() as events:
+            bus.publish(match())
+            assert (await events.next_batch())[0]["seq"] == 1
+            assert bus.has_subscribers
+        return events
+
+    events = asyncio.run(main())
+    assert events.closed and not bus.has_subscribers
+
+
+def test_subscription_on_a_closed_loop_expires():
+    bus = MatchEventBus()
+
+    async def main():
+        return bus.events()
+
+    events = asyncio.run(main())
+    assert not bus.has_subscribers and events.closed
+    bus.publish(match())
+    assert bus.published == 0
+
+
+def test_events_name_the_engine_and_its_target():
+    frame = np.random.default_rng(0).integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    templ = {"name": "target", "path": "target.png", "data": frame[40:70, 60:100].copy()}
+    bus = MatchEventBus()
+    sub = bus.subscription()
+    by_region = MatchEngine({"confidence": 0.8, "interval": 0.0, "region": (0, 0, 160, 120)}, [templ], events=bus)
+    by_window = MatchEngine({"confidence": 0.8, "interval": 0.0, "use_window": True, "target_hwnd": 7},
+                            [templ], events=bus)
+    by_region.process(frame, 0.0)
+    by_window.process(frame, 0.0, (100, 50))
+    first, second = sub.get_batch(timeout=0)
+    assert first["engine"] == by_region.id and first["target"] == {"region": [0, 0, 160, 120]}
+    assert second["engine"] == by_window.id and second["target"] == {"hwnd": 7}
+    assert by_region.id != by_window.id
@@ -0,0 +1,100 @@
+from clicker_core import FakeGeometryProvider, GeometryCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(**kwargs):
+    provider = FakeGeometryProvider(screen=(0, 0, 1920, 1080))
+    provider.set_window(1, "Game", (100, 100, 500, 400))
+    clock = Clock()
+    return provider, clock, GeometryCache(provider, clock=clock, **kwargs)
+
+
+def test_window_state_cached_within_ttl():
+    provider, clock, cache = make_cache(rect_ttl=0.2)
+    assert cache.window_state(1) == ((100, 100, 500, 400), False)
+    calls = provider.calls
+    provider.set_window(1, "Game", (0, 0, 10, 10))
+    clock.now = 0.1
+    assert cache.window_rect(1) == (100, 100, 500, 400)
+    assert provider.calls == calls
+
+
+def test_window_state_requeried_after_ttl():
+    provider, clock, cache = make_cache(rect_ttl=0.2)
+    cache.window_rect(1)
+    provider.set_window(1, "Game", (0, 0, 10, 10), iconic=True)
+    clock.now = 0.25
+    assert cache.window_state(1) == ((0, 0, 10, 10), True)
+
+
+def test_invalidate_single_window():
+    provider, clock, cache = make_cache(rect_ttl=10)
+    provider.set_window(2, "Other", (1, 1, 2, 2))
+    cache.window_rect(1)
+    cache.window_rect(2)
+    provider.set_window(1, "Game", (5, 5, 50, 50))
+    provider.set_window(2, "Other", (3, 3, 4, 4))
+    cache.invalidate(1)
+    assert cache.window_rect(1) == (5, 5, 50, 50)
+    assert cache.window_rect(2) == (1, 1, 2, 2)
+
+
+def test_lost_window_reported_as_none():
+    provider, clock, cache = make_cache(rect_ttl=10)
+    cache.window_rect(1)
+    provider.remove_window(1)
+    cache.invalidate(1)
+    assert cache.window_rect(1) is None
+
+
+def test_virtual_screen_and_monitor_ttl():
+    provider, clock, cache = make_cache(screen_ttl=2.0)
+    assert cache.monitor_for((-50, 10, 100, 100)) == {"left": 0, "top": 10, "width": 50, "height": 100}
+    provider.screen = (-100, 0, 2020, 1080)
+    clock.now = 1.0
+    assert cache.monitor_for((-50, 10, 100, 100))["left"] == 0
+    clock.now = 2.5
+    assert cache.monitor_for((-50, 10, 100, 100)) == {"left": -50, "top": 10, "width": 100, "height": 100}
+
+
+def test_monitor_outside_screen_is_none():
+    provider, clock, cache = make_cache()
+    assert cache.monitor_for((5000, 5000, 10, 10)) is None
+
+
+def test_invalidate_all_drops_screen_metrics():
+    provider, clock, cache = make_cache(screen_ttl=100)
+    cache.virtual_screen()
+    provider.screen = (0, 0, 800, 600)
+    cache.invalidate()
+    assert cache.virtual_screen() == (0, 0, 800, 600)
+
+
+def test_window_list_sorted_cached_and_refreshable():
+    provider, clock, cache = make_cache(list_ttl=2.0)
+    provider.set_window(2, "Alpha", (0, 0, 10, 10))
+    assert cache.window_list() == [(2, "Alpha"), (1, "Game")]
+    provider.set_window(3, "Beta", (0, 0, 10, 10))
+    assert cache.window_list() == [(2, "Alpha"), (1, "Game")]
+    assert cache.window_list(refresh=True) == [(2, "Alpha"), (3, "Beta"), (1, "Game")]
+    provider.remove_window(3)
+    clock.now = 3.0
+    assert cache.window_list() == [(2, "Alpha"), (1, "Game")]
+
+
+def test_stats_count_skipped_queries():
+    provider, clock, cache = make_cache(rect_ttl=1.0)
+    for i in range(10):
+        clock.now = i * 0.033
+        cache.window_state(1)
+    st = cache.stats()
+    assert st["requested"] == 20
+    assert st["queries"] == 2
+    assert st["saved"] == 18
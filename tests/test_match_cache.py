@@ -0,0 +1,117 @@
+import json
+
+import numpy as np
+
+from clicker_core import MatchCache, MatchEngine
+
+
+def frame(seed=0, shape=(90, 120, 3)):
+    return np.random.default_rng(seed).integers(0, 255, shape, dtype=np.uint8)
+
+
+def test_lru_evicts_least_recently_used_entry():
+    cache = MatchCache(max_entries=2)
+    cache.put("a", "t", 0.5, (1, 2))
+    cache.put("b", "t", 0.6, (3, 4))
+    assert cache.get("a", "t") == (0.5, (1, 2))
+    cache.put("c", "t", 0.7, (5, 6))
+    assert cache.get("b", "t") is None
+    assert cache.get("a", "t") is not None and cache.get("c", "t") is not None
+    st = cache.stats()
+    assert st["entries"] == 2 and st["evictions"] == 1
+    assert st["hits"] == 3 and st["misses"] == 1
+
+
+def test_byte_cap_evicts_before_entry_cap():
+    per_entry = MatchCache.ENTRY_BYTES + MatchCache.RESULT_BYTES
+    cache = MatchCache(max_entries=100, max_mb=(2 * per_entry + 10) / (1024 * 1024))
+    for i in range(5):
+        cache.put(f"f{i}", "t", 0.1, (0, 0))
+    assert cache.stats()["entries"] == 2 and cache.evictions == 3
+    assert cache._bytes == 2 * per_entry
+    cache.put("f4", "u", 0.2, (0, 0))
+    assert cache.stats()["entries"] == 1 and cache.get("f4", "u") is not None
+
+
+def test_save_load_round_trip_keeps_results_and_order(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = MatchCache(path=path)
+    cache.put("a", "t1", 0.91, (10, 20))
+    cache.put("a", "t2", 0.12, (0, 5))
+    cache.put("b", "t1", 0.5, (3, 3))
+    cache.get("a", "t1")
+    cache.save()
+
+    loaded = MatchCache(max_entries=1, path=path)
+    loaded.load()
+    assert loaded.get("a", "t1") == (0.91, (10, 20))
+    assert loaded.get("a", "t2") == (0.12, (0, 5))
+    assert loaded.get("b", "t1") is None
+
+
+def test_load_ignores_other_mode_and_corrupt_files(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = MatchCache(mode="perceptual", path=path)
+    cache.put("a", "t", 0.9, (1, 1))
+    cache.save()
+    exact = MatchCache(mode="exact", path=path)
+    exact.load()
+    assert exact.stats()["entries"] == 0
+
+    with open(path, "w") as f: f.write('{"mode": "exact", "entries": [["a", {"t": [0.9]}]]}')
+    exact.load()
+    assert exact.stats()["entries"] == 0 and exact._bytes == 0
+
+    with open(path, "w") as f: json.dump({"mode": "exact", "entries": [["a", {"t": [0.9, 1, 2]}]]}, f)
+    exact.load()
+    assert exact.get("a", "t") == (0.9, (1, 2))
+
+
+def test_frame_keys():
+    img = frame()
+    exact, perceptual = MatchCache(), MatchCache(mode="perceptual")
+    changed = img.copy()
+    changed[0, 0, 0] ^= 1
+    assert exact.frame_key(img) == exact.frame_key(img.copy())
+    assert exact.frame_key(img) != exact.frame_key(changed)
+    assert perceptual.frame_key(img) == perceptual.frame_key(changed)
+    assert exact.frame_key(img) != exact.frame_key(img[:, :60].copy())
+
+
+def test_template_key_follows_content():
+    data = frame(1, (20, 30, 3))
+    a, b = {"data": data}, {"data": data.copy()}
+    assert MatchCache.template_key(a) == MatchCache.template_key(b) == a["hash"]
+    assert MatchCache.template_key({"data": data.reshape(30, 20, 3)}) != a["hash"]
+
+
+def make_engine(cache):
+    img = frame()
+    templ = {"name": "t", "path": "t.png", "data": img[30:60, 40:80].copy()}
+    return img, MatchEngine({"confidence": 0.8, "interval": 0.0, "dedupe": False}, [templ], cache)
+
+
+def test_engine_skips_matching_on_a_hit():
+    cache = MatchCache()
+    img, engine = make_engine(cache)
+    first = engine.process(img, 0.0)
+    second = engine.process(img, 1.0)
+    assert engine.stats["full"] == 1 and engine.stats["cache_hits"] == 1
+    assert first["scores"] == second["scores"] and first["clicks"] == second["clicks"]
+
+
+def test_verify_mode_rematches_and_counts_mismatches():
+    cache = MatchCache(verify_rate=1.0)
+    img, engine = make_engine(cache)
+    engine.process(img, 0.0)
+    engine.process(img, 1.0)
+    assert engine.stats["full"] == 2 and cache.verified == 1 and cache.mismatches == 0
+
+    fkey = cache.frame_key(img)
+    tkey = MatchCache.template_key(engine.templates[0])
+    cache.put(fkey, tkey, 0.1, (0, 0))
+    result = engine.process(img, 2.0)
+    assert cache.verified == 2 and cache.mismatches == 1
+    assert result["clicks"] == [["t", 60, 45]]
+    assert cache.get(fkey, tkey)[1] == (40, 30)
+    assert MatchCache().record_verify((0.5, (1, 2)), (0.5004, (1, 2)))
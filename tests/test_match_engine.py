@@ -0,0 +1,111 @@
+import numpy as np
+
+from clicker_core import MatchEngine, ProfileStore, engine_config
+
+
+def noise_frame(seed=0, shape=(240, 320, 3)):
+    return np.random.default_rng(seed).integers(0, 255, shape, dtype=np.uint8)
+
+
+def crops(frame, n, size=40, seed=1):
+    rng = np.random.default_rng(seed)
+    fh, fw = frame.shape[:2]
+    out = []
+    for i in range(n):
+        x, y = int(rng.integers(0, fw - size)), int(rng.integers(0, fh - size))
+        out.append(({"name": f"t{i}", "path": f"t{i}.png", "data": frame[y:y + size, x:x + size].copy()}, (x, y)))
+    return out
+
+
+def test_every_exact_match_is_found():
+    # Fine textures decorrelate when downscaled, so no pre-filter may drop a
+    # template before its full-resolution match.
+    frame = noise_frame()
+    templates = crops(frame, 30)
+    engine = MatchEngine({"confidence": 0.8, "interval": 0.0, "multi_click": True},
+                         [t for t, _ in templates])
+    clicks = []
+    engine.process(frame, 0.0, on_click=lambda templ, x, y, score: clicks.append((templ['name'], x, y)))
+    expected = [(t['name'], x + 20, y + 20) for t, (x, y) in templates]
+    assert clicks == expected
+    assert engine.stats["full"] == 30
+
+
+def test_frames_inside_click_interval_are_skipped():
+    frame = noise_frame()
+    (templ, _), = crops(frame, 1)
+    engine = MatchEngine({"confidence": 0.8, "interval": 1.0}, [templ])
+    assert len(engine.process(frame, 5.0)["clicks"]) == 1
+    assert engine.process(frame, 5.5).get("gated")
+    assert len(engine.process(frame, 6.0)["clicks"]) == 1
+
+    engine = MatchEngine({"confidence": 0.8, "interval": 1.0, "skip_idle_frames": False}, [templ])
+    engine.process(frame, 5.0)
+    result = engine.process(frame, 5.5)
+    assert not result.get("gated") and result["scores"][0][1] >= 0.99 and not result["clicks"]
+
+
+def click_positions(config, templates, frame):
+    engine = MatchEngine(dict({"confidence": 0.8, "interval": 0.0, "multi_click": True}, **config), templates)
+    clicks = {}
+    engine.process(frame, 0.0, on_click=lambda templ, x, y, score: clicks.setdefault(templ['name'], (x, y)))
+    return engine, clicks
+
+
+def checkbox_pair():
+    unchecked = np.random.default_rng(5).integers(0, 255, (40, 40, 3), dtype=np.uint8)
+    checked = unchecked.copy()
+    checked[18:22, 18:22] = 0
+    return ({"name": "unchecked", "path": "u.png", "data": unchecked},
+            {"name": "checked", "path": "c.png", "data": checked})
+
+
+def test_near_duplicates_click_their_own_location():
+    unchecked, checked = checkbox_pair()
+    frame = noise_frame(seed=9)
+    frame[20:60, 20:60] = checked['data']
+    frame[150:190, 200:240] = unchecked['data']
+    engine, clicks = click_positions({}, [checked, unchecked], frame)
+    assert clicks == {"checked": (40, 40), "unchecked": (220, 170)}
+    assert engine.stats["roi"] == 0
+
+    engine, _ = click_positions({"dedupe_regions": True}, [checked, unchecked], frame)
+    assert engine.bank.near == 1
+
+
+def test_exact_duplicates_share_one_match():
+    frame = noise_frame()
+    (templ, (x, y)), = crops(frame, 1)
+    copy = dict(templ, name="copy", path="copy.png", data=templ['data'].copy())
+    engine, clicks = click_positions({}, [templ, copy], frame)
+    assert clicks == {"t0": (x + 20, y + 20), "copy": (x + 20, y + 20)}
+    assert engine.stats["full"] == 1 and engine.stats["shared"] == 1
+
+
+def test_region_search_falls_back_to_full_search():
+    # The crop's parent is not on screen, so the region around the parent's
+    # best spot misses and the crop must still be found where it really is.
+    parent = np.random.default_rng(7).integers(0, 255, (80, 80, 3), dtype=np.uint8)
+    crop = parent[20:60, 20:60].copy()
+    frame = noise_frame(seed=11)
+    frame[100:140, 150:190] = crop
+    templates = [{"name": "parent", "path": "p.png", "data": parent},
+                 {"name": "crop", "path": "c.png", "data": crop}]
+    engine, clicks = click_positions({"dedupe_regions": True}, templates, frame)
+    assert engine.bank.crops == 1
+    assert clicks == {"crop": (170, 120)}
+
+
+def test_profile_dedupe_settings_reach_the_engine(tmp_path):
+    store = ProfileStore(str(tmp_path))
+    store.save("off", {"dedupe": False})
+    store.save("regions", {"dedupe_regions": True, "dedupe_threshold": 0.9})
+    unchecked, checked = checkbox_pair()
+    ui = {"confidence": 0.8, "interval": 0.0}
+
+    engine = MatchEngine(engine_config(store.load("off"), ui), [checked, unchecked])
+    assert engine.analyze() is None
+
+    engine = MatchEngine(engine_config(store.load("regions"), ui), [checked, unchecked])
+    bank = engine.analyze()
+    assert bank.regions and bank.threshold == 0.9 and bank.near == 1
@@ -0,0 +1,149 @@
+import os
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+import clicker_core
+from clicker_core import LazyTemplate, ProfileStore, TemplateCache
+
+
+def png(path, seed=0, size=20):
+    img = np.random.default_rng(seed).integers(0, 255, (size, size, 3), dtype=np.uint8)
+    cv2.imwrite(str(path), img)
+    return img
+
+
+def test_profiles_roundtrip_one_file_each(tmp_path):
+    store = ProfileStore(str(tmp_path))
+    store.save("Farm: run/2", {"confidence": 0.9})
+    store.save("Default", {"confidence": 0.8})
+    files = sorted(f for f in os.listdir(tmp_path) if f != ProfileStore.INDEX)
+    assert len(files) == 2 and not any(f.endswith(".tmp") for f in os.listdir(tmp_path))
+    assert any(f.startswith("Farm__run_2_") for f in files)
+    again = ProfileStore(str(tmp_path))
+    assert again.names() == ["Default", "Farm: run/2"]
+    assert again.load("Farm: run/2") == {"confidence": 0.9}
+
+
+def test_names_that_slug_alike_get_separate_files(tmp_path):
+    store = ProfileStore(str(tmp_path))
+    store.save("a/b", {"n": 1})
+    store.save("a?b", {"n": 2})
+    again = ProfileStore(str(tmp_path))
+    assert again.load("a/b") == {"n": 1} and again.load("a?b") == {"n": 2}
+
+
+def test_unchanged_profile_is_not_rewritten(tmp_path):
+    store = ProfileStore(str(tmp_path))
+    assert store.save("Default", {"interval": 1.0})
+    assert not store.save("Default", {"interval": 1.0})
+    assert store.save("Default", {"interval": 2.0})
+    assert not ProfileStore(str(tmp_path)).save("Default", {"interval": 2.0})
+
+
+def test_write_replaces_the_file_atomically(tmp_path, monkeypatch):
+    store = ProfileStore(str(tmp_path))
+    store.save("Default", {"interval": 1.0})
+    path = store._path("Default")
+
+    def crash(src, dst):
+        raise OSError("power cut")
+    monkeypatch.setattr(clicker_core.os, "replace", crash)
+    with pytest.raises(OSError):
+        store.save("Default", {"interval": 2.0})
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["interval"] == 1.0
+
+
+def test_delete_and_index(tmp_path):
+    store = ProfileStore(str(tmp_path))
+    store.save("Default", {})
+    store.save("Other", {})
+    store.set_active("Other")
+    store.set_app_setting("lang", "RU")
+    store.delete("Default")
+    again = ProfileStore(str(tmp_path))
+    assert again.names() == ["Other"]
+    assert again.active == "Other" and again.app_setting("lang") == "RU"
+
+
+def test_legacy_settings_become_the_default_profile(tmp_path):
+    legacy = tmp_path / "clicker_settings.json"
+    legacy.write_text(json.dumps({"lang": "RU", "confidence": 0.7, "images": ["a.png"]}))
+    store = ProfileStore(str(tmp_path / "profiles"))
+    assert store.import_legacy(str(legacy))
+    assert store.names() == ["Default"]
+    assert store.load("Default") == {"confidence": 0.7, "images": ["a.png"]}
+    assert store.app_setting("lang") == "RU"
+    assert not ProfileStore(str(tmp_path / "profiles")).import_legacy(str(legacy))
+
+
+def test_missing_or_broken_legacy_file_seeds_an_empty_default(tmp_path):
+    broken = tmp_path / "clicker_settings.json"
+    broken.write_text("{not json")
+    store = ProfileStore(str(tmp_path / "p1"))
+    assert store.import_legacy(str(broken)) and store.load("Default") == {}
+    store = ProfileStore(str(tmp_path / "p2"))
+    assert store.import_legacy(str(tmp_path / "missing.json")) and store.names() == ["Default"]
+
+
+def test_template_cache_decodes_once_until_the_file_changes(tmp_path):
+    cache = TemplateCache()
+    path = tmp_path / "a.png"
+    png(path, seed=1)
+    first = cache.get(str(path))
+    assert cache.get(str(path)) is first and cache.decodes == 1 and cache.hits == 1
+    assert not first.flags.writeable
+    edited = png(path, seed=2, size=24)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert np.array_equal(cache.get(str(path)), edited) and cache.decodes == 2
+
+
+def test_template_cache_evicts_least_recently_used_over_the_byte_cap(tmp_path):
+    paths = [tmp_path / f"{i}.png" for i in range(3)]
+    for i, p in enumerate(paths):
+        png(p, seed=i)
+    cache = TemplateCache(max_mb=2 * 20 * 20 * 3 / (1024 * 1024))
+    cache.get(str(paths[0]))
+    cache.get(str(paths[1]))
+    cache.get(str(paths[0]))
+    cache.get(str(paths[2]))
+    assert cache._bytes <= cache.max_bytes and len(cache._images) == 2
+    cache.get(str(paths[0]))
+    assert cache.decodes == 3
+    cache.get(str(paths[1]))
+    assert cache.decodes == 4
+
+
+def test_unreadable_files_return_none(tmp_path):
+    cache = TemplateCache()
+    empty = tmp_path / "empty.png"
+    empty.write_bytes(b"")
+    junk = tmp_path / "junk.png"
+    junk.write_bytes(b"not a png")
+    assert cache.get(str(empty)) is None
+    assert cache.get(str(junk)) is None
+    assert cache.get(str(tmp_path / "missing.png")) is None
+
+
+def test_lazy_templates_share_decoded_images_across_profiles(tmp_path, monkeypatch):
+    cache = TemplateCache()
+    monkeypatch.setattr(clicker_core, "TEMPLATE_CACHE", cache)
+    paths = [str(tmp_path / f"{i}.png") for i in range(4)]
+    for i, p in enumerate(paths):
+        png(p, seed=i)
+    profiles = [[LazyTemplate(path=p, name=os.path.basename(p)) for p in paths[i:i + 2]] for i in range(3)]
+    assert cache.decodes == 0
+    images = {}
+    for templates in profiles:
+        for templ in templates:
+            assert images.setdefault(templ['path'], templ['data']) is templ['data']
+    assert cache.decodes == 4
+    bad = LazyTemplate(path=str(tmp_path / "missing.png"), name="missing.png")
+    with pytest.raises(ValueError):
+        bad['data']
+    with pytest.raises(KeyError):
+        bad['other']
@@ -0,0 +1,159 @@
+import time
+
+import numpy as np
+
+from clicker_core import MatchEngine, SessionReader, SessionRecorder, replay_session
+
+
+def frames_with_changes(n=6):
+    rng = np.random.default_rng(3)
+    base = rng.integers(0, 255, (60, 80, 3), dtype=np.uint8)
+    frames = []
+    for i in range(n):
+        f = base.copy()
+        f[i * 5:i * 5 + 4, 10:20] = i * 30
+        frames.append(f)
+    return frames
+
+
+def record(path, frames, fail_on=(), garble=()):
+    templates = [{"name": "a", "path": "a.png", "data": frames[0][20:40, 30:60].copy()}]
+    rec = SessionRecorder(str(path))
+    rec.start({"confidence": 0.8, "interval": 0.0}, templates)
+    write = rec._write
+    count = {"n": 0}
+
+    def flaky_write(kind, meta, blob=b""):
+        if kind == b"F":
+            count["n"] += 1
+            if count["n"] in fail_on:
+                raise OSError("disk full")
+            if count["n"] in garble:
+                blob = b"not a png"
+        return write(kind, meta, blob)
+
+    rec._write = flaky_write
+    for i, f in enumerate(frames):
+        rec.add_frame(float(i), f, (0, 0), {"scores": [], "clicks": []})
+    rec.stop()
+    return rec
+
+
+def test_roundtrip_reconstructs_frames(tmp_path):
+    frames = frames_with_changes()
+    path = tmp_path / "s.acsrec"
+    rec = record(path, frames)
+    assert rec.frames == len(frames) and rec.dropped == 0
+    got = [img for meta, img in SessionReader(str(path)).frames()]
+    assert all(np.array_equal(a, b) for a, b in zip(got, frames))
+
+
+def test_failed_write_does_not_corrupt_later_patches(tmp_path):
+    frames = frames_with_changes()
+    path = tmp_path / "s.acsrec"
+    rec = record(path, frames, fail_on={3})
+    assert rec.dropped == 1
+    got = [(meta["t"], img) for meta, img in SessionReader(str(path)).frames()]
+    assert [t for t, _ in got] == [0.0, 1.0, 3.0, 4.0, 5.0]
+    for t, img in got:
+        assert np.array_equal(img, frames[int(t)])
+
+
+
+def test_truncated_file_stops_at_the_last_whole_record(tmp_path):
+    frames = frames_with_changes()
+    path = tmp_path / "s.acsrec"
+    record(path, frames)
+    data = path.read_bytes()
+    path.write_bytes(data[:-30])
+    reader = SessionReader(str(path))
+    got = [meta["t"] for meta, img in reader.frames()]
+    assert got == [0.0, 1.0, 2.0, 3.0, 4.0] and reader.truncated
+    report = replay_session(str(path))
+    assert report["frames"] == 5 and report["truncated"]
+
+
+def test_any_truncation_point_is_readable(tmp_path):
+    path = tmp_path / "s.acsrec"
+    record(path, frames_with_changes())
+    data = path.read_bytes()
+    cut = tmp_path / "cut.acsrec"
+    for size in range(len(SessionRecorder.MAGIC), len(data), 13):
+        cut.write_bytes(data[:size])
+        list(SessionReader(str(cut)).frames())
+
+
+def test_undecodable_frames_are_skipped_until_the_next_full_frame(tmp_path):
+    frames = frames_with_changes()
+    path = tmp_path / "s.acsrec"
+    record(path, frames, garble={3})
+    reader = SessionReader(str(path))
+    got = [(meta["t"], img) for meta, img in reader.frames()]
+    assert [t for t, _ in got][:2] == [0.0, 1.0] and 2.0 not in [t for t, _ in got]
+    assert reader.skipped >= 1 and len(got) + reader.skipped == len(frames)
+    for t, img in got:
+        assert np.array_equal(img, frames[int(t)])
+
+
+def test_recording_is_flushed_while_running(tmp_path):
+    frames = frames_with_changes(2)
+    path = tmp_path / "s.acsrec"
+    rec = SessionRecorder(str(path), flush_interval=0.0)
+    rec.start({"confidence": 0.8}, [])
+    for i, f in enumerate(frames):
+        rec.add_frame(float(i), f, (0, 0), {"scores": [], "clicks": []})
+    deadline = time.monotonic() + 5
+    while rec.frames < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    try:
+        assert len(list(SessionReader(str(path)).frames())) == 2
+    finally:
+        rec.stop()
+
+
+def scene(n=8):
+    # Odd frames show the target; even frames only background noise.
+    rng = np.random.default_rng(5)
+    base = rng.integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    target = rng.integers(0, 255, (24, 24, 3), dtype=np.uint8)
+    frames = []
+    for i in range(n):
+        f = base.copy()
+        if i % 2:
+            f[40 + i:64 + i, 60:84] = target
+        frames.append(f)
+    return frames, [{"name": "target", "path": "target.png", "data": target}]
+
+
+def record_run(path, frames, templates, config):
+    engine = MatchEngine(config, templates)
+    rec = SessionRecorder(str(path), max_queue=len(frames) + 1)
+    rec.start(config, templates)
+    clicks = 0
+    for i, f in enumerate(frames):
+        result = engine.process(f, float(i))
+        clicks += len(result["clicks"])
+        rec.add_frame(float(i), f, (0, 0), result)
+    rec.stop()
+    assert rec.dropped == 0
+    return clicks
+
+
+def test_replay_matches_the_recorded_decisions(tmp_path):
+    frames, templates = scene()
+    path = tmp_path / "run.acsrec"
+    clicks = record_run(path, frames, templates, {"confidence": 0.8, "interval": 0.0})
+    report = replay_session(str(path))
+    assert clicks == 4
+    assert report["frames"] == len(frames) and report["clicks"] == clicks
+    assert report["diffs"] == [] and report["max_score_delta"] < 1e-3
+
+
+def test_replay_reports_diffs_for_an_overridden_config(tmp_path):
+    frames, templates = scene()
+    path = tmp_path / "run.acsrec"
+    record_run(path, frames, templates, {"confidence": 0.8, "interval": 0.0})
+    report = replay_session(str(path), config={"confidence": 1.01})
+    assert report["clicks"] == 0
+    assert [d["frame"] for d in report["diffs"]] == [2, 4, 6, 8]
+    assert all(d["replayed"] == [] and d["recorded"][0][0] == "target" for d in report["diffs"])